@@ -0,0 +1,85 @@
+import argparse
+import random
+import string
+import sys
+
+from benchmarks.report import measure, write_report
+from benchmarks.workloads import test_workloads
+from src.Lexer import Lexer
+from src.Regex import parse_regex
+
+
+def keywords(count: int) -> list[str]:
+    # distinct pseudo-random lowercase words, the same ones on every run
+    generator = random.Random(count)
+    words: set[str] = set()
+    while len(words) < count:
+        words.add(''.join(generator.choices(string.ascii_lowercase, k=generator.randint(3, 10))))
+    return sorted(words)
+
+
+def exponential(n: int) -> str:
+    # (a|b)*a(a|b)^n, the classic family whose minimal dfa has 2^(n+1) states
+    return '(a|b)*a' + '(a|b)' * n
+
+
+def nested_quantifiers(depth: int) -> str:
+    return '(' * depth + 'a*b?' + ')*' * depth
+
+
+def regex_workloads(quick: bool) -> list[tuple[str, dict, str]]:
+    regexes, _ = test_workloads()
+    workloads = [('test_hw_2', {'index': index}, regex) for index, regex in enumerate(regexes)]
+    workloads += [('exponential', {'n': n}, exponential(n)) for n in range(2, 9 if quick else 15, 2)]
+    workloads += [('nested_quantifiers', {'depth': depth}, nested_quantifiers(depth))
+                  for depth in ((2, 8, 32) if quick else (2, 8, 32, 128, 512))]
+    workloads += [('keyword_alternation', {'keywords': count}, '|'.join(keywords(count)))
+                  for count in ((10, 100) if quick else (10, 100, 1000, 10000))]
+    return workloads
+
+
+def spec_workloads(quick: bool) -> list[tuple[str, dict, list[tuple[str, str]]]]:
+    _, specs = test_workloads()
+    workloads = [('test_hw_3', {'index': index}, spec) for index, spec in enumerate(specs)]
+    for count in ((10, 50) if quick else (10, 50, 300, 1000)):
+        rules = [(word.upper(), word) for word in keywords(count)]
+        workloads.append(('keyword_rules', {'rules': count + 2},
+                          rules + [('ID', '[a-z]+'), ('SPACE', '\\ ')]))
+    return workloads
+
+
+def run(quick: bool, memory: bool) -> list[dict]:
+    results = []
+
+    def record(workload: str, params: dict, stage: str, function, **sizes) -> object:
+        result, seconds, peak = measure(function, memory)
+        results.append({'workload': workload, 'params': params, 'stage': stage,
+                        'seconds': seconds, 'peak_bytes': peak, **sizes})
+        print(f'{workload:>20} {params} {stage:<20} {seconds:.4f}s', file=sys.stderr)
+        return result
+
+    for workload, params, regex in regex_workloads(quick):
+        parsed = record(workload, params, 'parse_regex', lambda: parse_regex(regex), pattern_size=len(regex))
+        nfa = record(workload, params, 'thompson', parsed.thompson)
+        record(workload, params, 'epsilon_closure', lambda: [nfa.epsilon_closure(state) for state in nfa.K],
+               nfa_states=len(nfa.K), nfa_edges=sum(map(len, nfa.d.values())))
+        dfa = record(workload, params, 'subset_construction', nfa.subset_construction)
+        results[-1]['dfa_states'] = len(dfa.K)
+
+    for workload, params, spec in spec_workloads(quick):
+        lexer = record(workload, params, 'generate_dfa', lambda: Lexer(spec))
+        results[-1]['dfa_states'] = len(lexer.dfa.K)
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Time the regex to dfa pipeline on parametrised workloads')
+    parser.add_argument('--quick', action='store_true', help='only run the small parameters')
+    parser.add_argument('--no-memory', action='store_true', help='skip the traced run that measures peak memory')
+    parser.add_argument('--output', help='write the json results here instead of stdout')
+    args = parser.parse_args()
+    write_report('automata', run(args.quick, not args.no_memory), args.output)
+
+
+if __name__ == '__main__':
+    main()
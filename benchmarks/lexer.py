@@ -0,0 +1,141 @@
+import argparse
+import random
+import string
+import sys
+from collections.abc import Callable
+from pathlib import Path
+
+from benchmarks.report import measure, write_report
+from benchmarks.workloads import test_hw_3_workloads
+from src.Lexer import Lexer
+from src.Spec import SKIP, SPEC
+
+SIZES = [1_000, 10_000, 100_000, 1_000_000, 10_000_000, 100_000_000]
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def repeat_to(size: int, generate_block: Callable[[random.Random], str]) -> str:
+    # blocks from a seeded generator until size characters, so every run lexes the same program
+    generator, blocks, length = random.Random(size), [], 0
+    while length < size:
+        blocks.append(generate_block(generator))
+        length += len(blocks[-1])
+    return ''.join(blocks)
+
+
+def bonus_programs(size: int) -> str:
+    source = '\n'.join(path.read_text() for path in sorted((ROOT / 'bonus_tests').glob('*.l'))) + '\n'
+    return source * max(1, size // len(source))
+
+
+def deep_nesting(size: int) -> str:
+    def block(generator: random.Random) -> str:
+        depth = generator.randint(50, 500)
+        return '(+ ' * depth + '1' + ' 2)' * depth + '\n'
+    return repeat_to(size, block)
+
+
+def long_identifiers(size: int) -> str:
+    def block(generator: random.Random) -> str:
+        names = [''.join(generator.choices(string.ascii_letters, k=generator.randint(100, 2000))) for _ in range(4)]
+        return f'((lambda {names[0]}: ({names[0]} {names[1]})) {names[2]} {names[3]})\n'
+    return repeat_to(size, block)
+
+
+def long_numbers(size: int) -> str:
+    def block(generator: random.Random) -> str:
+        numbers = [''.join(generator.choices(string.digits, k=generator.randint(100, 2000))) for _ in range(3)]
+        return f'(+ ({" ".join(numbers)}))\n'
+    return repeat_to(size, block)
+
+
+def whitespace_heavy(size: int) -> str:
+    def block(generator: random.Random) -> str:
+        indent = '\t' * generator.randint(1, 8) + ' ' * generator.randint(0, 40)
+        return f'(++\n{indent}(1   2)\n\n{indent}  (  x\t\ty  )\n{indent})\n\n\n'
+    return repeat_to(size, block)
+
+
+SHAPES = {
+    'bonus_programs': bonus_programs,
+    'deep_nesting': deep_nesting,
+    'long_identifiers': long_identifiers,
+    'long_numbers': long_numbers,
+    'whitespace_heavy': whitespace_heavy,
+}
+
+
+def run(sizes: list[int], scanners: list[str], repeat: int, memory: bool, backends: list[str]) -> list[dict]:
+    lexers = {'SPEC': Lexer(SPEC), 'SPEC+skip': Lexer(SPEC, skip=SKIP)}
+    workloads = [(shape, 'SPEC', generate) for shape, generate in SHAPES.items()]
+    test_hw_3 = test_hw_3_workloads()
+    for name, spec, unit in test_hw_3:
+        lexers[name] = Lexer(spec)
+        workloads.append((name, name, lambda size, unit=unit: unit * max(1, size // len(unit))))
+    workloads += [(shape, 'SPEC+skip', generate) for shape, generate in SHAPES.items() if shape == 'whitespace_heavy']
+    if 're' in backends:
+        # the re backend only changes lex, and only for the specs it can translate
+        lexers['SPEC+re'] = Lexer(SPEC, backend='re')
+        workloads += [(shape, 'SPEC+re', generate) for shape, generate in SHAPES.items()]
+        for name, spec, unit in test_hw_3:
+            try:
+                lexers[f'{name}+re'] = Lexer(spec, backend='re')
+            except ValueError:
+                continue
+            workloads.append((name, f'{name}+re', lambda size, unit=unit: unit * max(1, size // len(unit))))
+        if 'dfa' not in backends:
+            workloads = [workload for workload in workloads if workload[1].endswith('+re')]
+
+    results = []
+    for shape, lexer_name, generate in workloads:
+        lexer = lexers[lexer_name]
+        for size in sizes:
+            word = generate(size)
+            for scanner in scanners:
+                if lexer.backend == 're' and scanner != 'lex':
+                    # only lex uses the re backend, the other scanners would repeat the rows of the dfa
+                    continue
+                function = getattr(lexer, scanner)
+                seconds = float('inf')
+                for run_index in range(repeat):
+                    tokens, elapsed, peak = measure(lambda: function(word), memory and run_index == 0)
+                    seconds = min(seconds, elapsed)
+                    if run_index == 0:
+                        peak_bytes = peak
+                results.append({
+                    'shape': shape,
+                    'lexer': lexer_name,
+                    'backend': lexer.backend,
+                    'scanner': scanner,
+                    'size': len(word),
+                    'tokens': len(tokens),
+                    'seconds': seconds,
+                    'tokens_per_second': len(tokens) / seconds if seconds else None,
+                    'bytes_per_second': len(word) / seconds if seconds else None,
+                    'peak_bytes': peak_bytes,
+                })
+                print(f'{shape:>18} {lexer_name:>15} {scanner:>8} {len(word):>11} bytes {len(tokens):>10} tokens '
+                      f'{seconds:.4f}s', file=sys.stderr)
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Lexer throughput on generated SPEC programs and the test_hw_3 '
+                                                 'specs, from 1 KB to 100 MB')
+    parser.add_argument('--max-size', type=int, default=SIZES[-1])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--scanner', action='append', choices=['lex', 'tokenize'],
+                        help='the Lexer method to time, can be given several times (default: lex)')
+    parser.add_argument('--backend', action='append', choices=['dfa', 're'],
+                        help='the Lexer backend to time, can be given several times (default: dfa)')
+    parser.add_argument('--no-memory', action='store_true', help='skip the traced run that measures peak memory')
+    parser.add_argument('--output', help='write the json results here instead of stdout')
+    args = parser.parse_args()
+
+    sizes = [size for size in SIZES if size <= args.max_size]
+    write_report('lexer', run(sizes, args.scanner or ['lex'], args.repeat, not args.no_memory, args.backend or ['dfa']),
+                 args.output)
+
+
+if __name__ == '__main__':
+    main()
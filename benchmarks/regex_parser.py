@@ -0,0 +1,80 @@
+import argparse
+import gc
+import sys
+import time
+
+from benchmarks.report import write_report
+from src.Regex import parse_regex
+
+SIZES = [1_000, 10_000, 100_000, 1_000_000, 10_000_000]
+
+
+def flat_pattern(size: int) -> str:
+    # long concatenations of quantified groups and character ranges, like generated token rules
+    chunk = '(ab|c)*d+[0-9]?\\ '
+    return (chunk * (size // len(chunk) + 1))[:size - size % len(chunk)]
+
+
+def nested_pattern(size: int) -> str:
+    depth = (size - 1) // 3
+    return '(' * depth + 'a' + ')*' * depth
+
+
+def keywords_pattern(size: int) -> str:
+    keywords, length, number = [], 0, 0
+    while length + 8 < size:
+        keywords.append(f'kw{number:05}')
+        length += len(keywords[-1]) + 1
+        number += 1
+    return '|'.join(keywords)
+
+
+SHAPES = {
+    'flat': flat_pattern,
+    'nested': nested_pattern,
+    'keywords': keywords_pattern,
+}
+
+
+def run(sizes: list[int], repeat: int, pause_gc: bool) -> list[dict]:
+    results = []
+    for shape, generate in SHAPES.items():
+        for size in sizes:
+            pattern = generate(size)
+            timings = []
+            for _ in range(repeat):
+                # the ast has no reference cycles, so with pause_gc the cyclic collector is left out of the timing
+                if pause_gc:
+                    gc.disable()
+                try:
+                    start = time.perf_counter()
+                    parse_regex(pattern)
+                    timings.append(time.perf_counter() - start)
+                finally:
+                    gc.enable()
+            best = min(timings)
+            results.append({
+                'shape': shape,
+                'size': len(pattern),
+                'gc': not pause_gc,
+                'seconds': best,
+                'bytes_per_second': len(pattern) / best if best else None,
+            })
+            print(f'{shape:>8} {len(pattern):>10} bytes {best:.4f}s', file=sys.stderr)
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Time parse_regex on generated patterns from 1 KB to 10 MB')
+    parser.add_argument('--max-size', type=int, default=SIZES[-1])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--pause-gc', action='store_true', help='disable the cyclic garbage collector while parsing')
+    parser.add_argument('--output', help='write the json results here instead of stdout')
+    args = parser.parse_args()
+
+    write_report('regex_parser', run([size for size in SIZES if size <= args.max_size], args.repeat, args.pause_gc),
+                 args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,30 @@
+import json
+import time
+import tracemalloc
+from collections.abc import Callable
+from typing import Any
+
+
+def measure(function: Callable[[], Any], memory: bool = True) -> tuple[Any, float, int | None]:
+    # time the call without tracing (tracemalloc slows allocations down), then run it again traced for the peak
+    start = time.perf_counter()
+    result = function()
+    seconds = time.perf_counter() - start
+    if not memory:
+        return result, seconds, None
+    tracemalloc.start()
+    try:
+        function()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, seconds, peak
+
+
+def write_report(benchmark: str, results: list[dict], output: str | None) -> None:
+    report = json.dumps({'benchmark': benchmark, 'results': results}, indent=2)
+    if output:
+        with open(output, 'w') as file:
+            file.write(report)
+    else:
+        print(report)
@@ -0,0 +1,46 @@
+import ast
+import warnings
+from pathlib import Path
+
+from src.Lexer import Lexer
+
+TESTS = Path(__file__).resolve().parent.parent / 'test'
+
+
+def parse_test(filename: str) -> ast.Module:
+    with warnings.catch_warnings():
+        # the test sources contain a few regexes with invalid escape sequences
+        warnings.simplefilter('ignore', SyntaxWarning)
+        return ast.parse((TESTS / filename).read_text())
+
+
+def test_workloads() -> tuple[list[str], list[list[tuple[str, str]]]]:
+    # the regexes of test_hw_2 and the specs of test_hw_3, read from the test sources
+    regexes, specs = [], []
+    for filename, target, found in (('test_hw_2.py', 'regex', regexes), ('test_hw_3.py', 'spec', specs)):
+        for node in ast.walk(parse_test(filename)):
+            if isinstance(node, ast.Assign) and any(getattr(name, 'id', None) == target for name in node.targets):
+                found.append(ast.literal_eval(node.value))
+    return regexes, specs
+
+
+def test_hw_3_workloads() -> list[tuple[str, list[tuple[str, str]], str]]:
+    # The specs of test_hw_3, each with a unit to repeat taken from its test inputs: all of them joined,
+    # or else the first single input that still lexes without error when it is repeated
+    workloads = []
+    for node in ast.walk(parse_test('test_hw_3.py')):
+        if not isinstance(node, ast.FunctionDef):
+            continue
+        values = {target.id: statement.value for statement in node.body if isinstance(statement, ast.Assign)
+                  for target in statement.targets if isinstance(target, ast.Name)}
+        if 'spec' not in values or 'tests' not in values:
+            continue
+        spec, tests = ast.literal_eval(values['spec']), ast.literal_eval(values['tests'])
+        lexer = Lexer(spec)
+        words = [word for word, _ in tests]
+        for unit in [''.join(words)] + words:
+            tokens = lexer.lex(unit * 3)
+            if unit and tokens and tokens[-1][0]:
+                workloads.append((node.name, spec, unit))
+                break
+    return workloads
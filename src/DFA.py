@@ -1,5 +1,11 @@
+import random
+from bisect import bisect_right
+from collections import deque
 from dataclasses import dataclass
+from itertools import accumulate
 from functools import reduce
+from typing import Any
+from collections.abc import Mapping
 
 
 @dataclass
@@ -15,6 +21,157 @@ class DFA[STATE]:
         final_state = reduce(lambda state, symbol: self.d.get((state, symbol), None), word, self.q0)
         return final_state in self.F
 
+    def matcher(self) -> 'DFAMatcher[STATE]':
+        # an incremental matcher that consumes the word in chunks, see DFAMatcher
+        return DFAMatcher(self)
+
+    def count(self, n: int) -> int:
+        # the number of accepted words of length n
+        _, ways = self._word_counts(n)
+        return ways[n][0]
+
+    def sample(self, n: int, k: int, rng: random.Random | None = None) -> list[str]:
+        # k accepted words of length n drawn uniformly at random (with replacement): every step picks the next
+        # state with a probability proportional to the number of accepted completions it leads to
+        moves, ways = self._word_counts(n)
+        if not ways[n][0]:
+            raise ValueError(f'The dfa accepts no word of length {n}')
+        rng = rng or random.Random()
+        choices: dict[tuple[int, int], tuple[list[int], list[tuple[int, list[str]]]]] = {}
+        samples = []
+        for _ in range(k):
+            state, word = 0, []
+            for remaining in range(n, 0, -1):
+                if (remaining, state) not in choices:
+                    options = [(next_state, symbols) for next_state, symbols in moves[state]
+                               if ways[remaining - 1][next_state]]
+                    bounds = list(accumulate(len(symbols) * ways[remaining - 1][next_state]
+                                             for next_state, symbols in options))
+                    choices[(remaining, state)] = bounds, options
+                bounds, options = choices[(remaining, state)]
+                if len(options) == 1:
+                    state, symbols = options[0]
+                else:
+                    state, symbols = options[bisect_right(bounds, rng.randrange(bounds[-1]))]
+                word.append(symbols[0] if len(symbols) == 1 else rng.choice(symbols))
+            samples.append(''.join(word))
+        return samples
+
+    def _word_counts(self, n: int) -> tuple[list[list[tuple[int, list[str]]]], list[list[int]]]:
+        # number the states from q0 = 0, group the symbols of every state by their target, then count
+        # ways[length][state], the accepted words of that length read from that state
+        numbering = {self.q0: 0}
+        queue = deque([self.q0])
+        moves: list[list[tuple[int, list[str]]]] = []
+        while queue:
+            state = queue.popleft()
+            targets: dict[int, list[str]] = {}
+            for symbol in sorted(self.S):
+                next_state = self.d.get((state, symbol))
+                if next_state is None:
+                    continue
+                if next_state not in numbering:
+                    numbering[next_state] = len(numbering)
+                    queue.append(next_state)
+                targets.setdefault(numbering[next_state], []).append(symbol)
+            moves.append(list(targets.items()))
+        ways = [[int(state in self.F) for state in numbering]]
+        for _ in range(n):
+            previous = ways[-1]
+            ways.append([sum(len(symbols) * previous[next_state] for next_state, symbols in state_moves)
+                         for state_moves in moves])
+        return moves, ways
+
+    def live_states(self) -> set[STATE]:
+        # the states from which a final state can still be reached
+        predecessors: dict[STATE, set[STATE]] = {}
+        for (state, _), next_state in self.d.items():
+            predecessors.setdefault(next_state, set()).add(state)
+        live, queue = set(self.F), deque(self.F)
+        while queue:
+            for state in predecessors.get(queue.popleft(), ()):
+                if state not in live:
+                    live.add(state)
+                    queue.append(state)
+        return live
+
+    def minimize(self) -> 'DFA[int]':
+        # merge equivalent states with Moore's partition refinement; unreachable states are dropped
+        # and the remaining blocks are numbered in breadth-first order, so q0 is always 0
+        symbols = sorted(self.S)
+        reachable, queue = {self.q0}, deque([self.q0])
+        while queue:
+            state = queue.popleft()
+            for symbol in symbols:
+                next_state = self.d.get((state, symbol))
+                if next_state is not None and next_state not in reachable:
+                    reachable.add(next_state)
+                    queue.append(next_state)
+        block = {state: int(state in self.F) for state in reachable}
+        blocks_count = len(set(block.values()))
+        while True:
+            signatures: dict[tuple, int] = {}
+            block = {state: signatures.setdefault(
+                        (block[state], *(block.get(self.d.get((state, symbol))) for symbol in symbols)),
+                        len(signatures))
+                     for state in reachable}
+            if len(signatures) == blocks_count:
+                break
+            blocks_count = len(signatures)
+
+        numbering = {block[self.q0]: 0}
+        queue = deque([self.q0])
+        visited = {self.q0}
+        transitions: dict[tuple[int, str], int] = {}
+        while queue:
+            state = queue.popleft()
+            for symbol in symbols:
+                next_state = self.d.get((state, symbol))
+                if next_state is None:
+                    continue
+                numbering.setdefault(block[next_state], len(numbering))
+                transitions[(numbering[block[state]], symbol)] = numbering[block[next_state]]
+                if next_state not in visited:
+                    visited.add(next_state)
+                    queue.append(next_state)
+        final_states = {numbering[block[state]] for state in reachable if state in self.F}
+        return DFA(S=set(self.S), K=set(numbering.values()), q0=0, d=transitions, F=final_states)
+
+    def trim(self) -> 'DFA[STATE]':
+        # drop the states that cannot reach a final state, the result is a partial dfa
+        live = self.live_states()
+        transitions = {(state, symbol): next_state for (state, symbol), next_state in self.d.items()
+                       if state in live and next_state in live}
+        return DFA(S=set(self.S), K=live | {self.q0}, q0=self.q0, d=transitions, F=set(self.F))
+
+    @staticmethod
+    def product_step(dfas: 'list[DFA] | Mapping[int, DFA]', state: frozenset[tuple[int, Any]],
+                     symbol: str) -> frozenset[tuple[int, Any]]:
+        # advance every component of a product state, the components that have no transition are dropped
+        # (dfas is indexed by the first item of the components, a list or a mapping of ids)
+        return frozenset((index, dfas[index].d[(component, symbol)]) for index, component in state
+                         if (component, symbol) in dfas[index].d)
+
+    @staticmethod
+    def product(dfas: 'list[DFA]') -> 'DFA[frozenset[tuple[int, Any]]]':
+        # lazily build the union product of the given dfas: a product state is the set of
+        # (index, state) pairs of the dfas that can still accept, so the sink is the empty set
+        dfas = [dfa.trim() for dfa in dfas]
+        alphabet = set().union(*(dfa.S for dfa in dfas))
+        initial = frozenset((index, dfa.q0) for index, dfa in enumerate(dfas))
+        states, queue = {initial}, deque([initial])
+        transitions: dict[tuple[frozenset[tuple[int, Any]], str], frozenset[tuple[int, Any]]] = {}
+        while queue:
+            current = queue.popleft()
+            for symbol in alphabet:
+                next_state = DFA.product_step(dfas, current, symbol)
+                if next_state not in states:
+                    states.add(next_state)
+                    queue.append(next_state)
+                transitions[(current, symbol)] = next_state
+        final_states = {state for state in states if any(s in dfas[index].F for index, s in state)}
+        return DFA(S=alphabet, K=states, q0=initial, d=transitions, F=final_states)
+
     def __repr__(self) -> str:
         states_str = ', '.join(map(str, self.K))
         alphabet_str = ', '.join(self.S)
@@ -28,3 +185,39 @@ class DFA[STATE]:
                 f"  Initial State: {self.q0},\n"
                 f"  Accepting States: {{{accepting_states_str}}}\n"
                 f")")
+
+
+class DFAMatcher[STATE]:
+    # Resumable simulation of a dfa over a word that arrives in chunks, in constant memory: only the current
+    # state is kept between calls to feed. Chunks are str, or bytes whose values are read as the characters
+    # with the same code. Once the dfa reaches a state that cannot accept any more, the rest is skipped.
+    def __init__(self, dfa: DFA[STATE]) -> None:
+        self.dfa = dfa
+        self.live = dfa.live_states()
+        self.reset()
+
+    def reset(self) -> None:
+        self.state = self.dfa.q0
+        self.position = 0
+        self.is_dead = self.state not in self.live
+
+    def feed(self, chunk: str | bytes) -> bool:
+        # advance over the chunk, returns False as soon as the word can no longer be accepted
+        if self.is_dead:
+            return False
+        if isinstance(chunk, (bytes, bytearray, memoryview)):
+            chunk = bytes(chunk).decode('latin-1')
+        d, live, state = self.dfa.d, self.live, self.state
+        for index, symbol in enumerate(chunk):
+            state = d.get((state, symbol))
+            if state not in live:
+                self.position += index
+                self.is_dead = True
+                return False
+        self.state = state
+        self.position += len(chunk)
+        return True
+
+    @property
+    def is_accepting(self) -> bool:
+        return not self.is_dead and self.state in self.dfa.F
@@ -0,0 +1,293 @@
+import json
+import mmap
+import shutil
+import struct
+import sys
+import threading
+from array import array
+from collections import deque
+from collections.abc import Callable, Mapping, Sequence, Set
+from dataclasses import dataclass, field
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+from typing import Any, BinaryIO
+
+from .DFA import DFA
+from .NFA import SINK_STATE
+
+# magic, number of character codes, classes, states, the initial state, the sink and the size of the labels
+HEADER = struct.Struct('<8sqqqqqq')
+MAGIC = b'DFATABLE'
+
+
+@dataclass
+class DFATable:
+    # Integer form of a dfa: states are numbered from 0 and characters are mapped to classes of characters
+    # with identical transitions. Class 0 holds every character outside the alphabet and always leads to
+    # the sink. accept[state] is the index of the state's label in labels, or -1 if the state is not final.
+    classes: Sequence[int]
+    transitions: Sequence[int]
+    accept: Sequence[int]
+    labels: list[str]
+    start: int
+    sink: int
+    _buffer: Any = field(default=None, repr=False, compare=False)
+
+    @property
+    def n_classes(self) -> int:
+        return len(self.transitions) // len(self.accept)
+
+    @staticmethod
+    def number_states(dfa: DFA, sink: Any = SINK_STATE) -> dict[Any, int]:
+        # number the states breadth-first from the initial state, the sink is added if it is not reachable
+        symbols = sorted(dfa.S)
+        numbering = {dfa.q0: 0}
+        queue = deque([dfa.q0])
+        while queue:
+            state = queue.popleft()
+            for symbol in symbols:
+                next_state = dfa.d.get((state, symbol), sink)
+                if next_state not in numbering:
+                    numbering[next_state] = len(numbering)
+                    queue.append(next_state)
+        numbering.setdefault(sink, len(numbering))
+        return numbering
+
+    @staticmethod
+    def from_dfa(dfa: DFA, label: Callable[[Any], str | None], sink: Any = SINK_STATE,
+                 numbering: dict[Any, int] | None = None) -> 'DFATable':
+        # the rows follow numbering, by default the one of number_states
+        symbols = sorted(dfa.S)
+        if numbering is None:
+            numbering = DFATable.number_states(dfa, sink)
+        states = sorted(numbering, key=numbering.get)
+
+        columns: dict[tuple[int, ...], int] = {}
+        symbol_classes = {}
+        for symbol in symbols:
+            column = tuple(numbering[dfa.d.get((state, symbol), sink)] for state in states)
+            symbol_classes[symbol] = columns.setdefault(column, len(columns) + 1)
+        classes = array('i', [0]) * (max(map(ord, symbols), default=-1) + 1)
+        for symbol, symbol_class in symbol_classes.items():
+            classes[ord(symbol)] = symbol_class
+
+        n_classes = len(columns) + 1
+        transitions = array('i', [numbering[sink]]) * (len(states) * n_classes)
+        for column, symbol_class in columns.items():
+            for state, next_state in enumerate(column):
+                transitions[state * n_classes + symbol_class] = next_state
+
+        labels: list[str] = []
+        label_ids: dict[str, int] = {}
+        accept = array('i', [-1]) * len(states)
+        for state_id, state in enumerate(states):
+            state_label = label(state)
+            if state_label is None:
+                continue
+            if state_label not in label_ids:
+                label_ids[state_label] = len(labels)
+                labels.append(state_label)
+            accept[state_id] = label_ids[state_label]
+        return DFATable(classes=classes, transitions=transitions, accept=accept, labels=labels,
+                        start=0, sink=numbering[sink])
+
+    def update_rows(self, rows: Mapping[int, Mapping[str, int]], labels: Mapping[int, str | None]) -> None:
+        # Rewrite the given rows in place, the rows past the end are appended (their ids must follow on). A row
+        # maps symbols to states, a missing symbol leads to the sink. A class whose symbols the new rows tell
+        # apart is split and a symbol new to the table gets a class of its own: the existing rows copy the
+        # column of the class the symbols came from, so only the given rows are computed.
+        sink = self.sink
+        members: dict[int, list[int]] = {}
+        for code, symbol_class in enumerate(self.classes):
+            members.setdefault(symbol_class, []).append(code)
+        codes = {ord(symbol) for row in rows.values() for symbol in row}
+        members.setdefault(0, []).extend(code for code in codes if code >= len(self.classes))
+        n_classes, dead = self.n_classes, (sink,) * len(rows)
+        sources, representatives, classes = [], {}, {}
+        for symbol_class, class_codes in members.items():
+            groups: dict[tuple[int, ...], list[int]] = {}
+            for code in class_codes:
+                signature = tuple(row.get(chr(code), sink) for row in rows.values()) if code in codes else dead
+                groups.setdefault(signature, []).append(code)
+            for signature, group in groups.items():
+                if symbol_class == 0 and signature == dead:
+                    continue
+                if symbol_class and group is next(iter(groups.values())):
+                    new_class = symbol_class
+                else:
+                    new_class = n_classes + len(sources)
+                    sources.append(symbol_class)
+                representatives[new_class] = chr(group[0])
+                classes.update(dict.fromkeys(group, new_class))
+
+        if sources:
+            width = n_classes + len(sources)
+            transitions = array('i', [sink]) * (len(self.accept) * width)
+            for symbol_class, source in enumerate(list(range(n_classes)) + sources):
+                transitions[symbol_class::width] = array('i', self.transitions[source::n_classes])
+            self.transitions, n_classes = transitions, width
+        if classes and max(classes) >= len(self.classes):
+            self.classes = array('i', self.classes) + array('i', [0]) * (max(classes) + 1 - len(self.classes))
+        for code, symbol_class in classes.items():
+            self.classes[code] = symbol_class
+
+        for state in sorted(rows):
+            row = array('i', [sink]) * n_classes
+            for symbol_class, symbol in representatives.items():
+                row[symbol_class] = rows[state].get(symbol, sink)
+            label = labels.get(state)
+            if label is not None and label not in self.labels:
+                self.labels.append(label)
+            label_id = self.labels.index(label) if label is not None else -1
+            if state == len(self.accept):
+                self.transitions.extend(row)
+                self.accept.append(label_id)
+            else:
+                self.transitions[state * n_classes:(state + 1) * n_classes] = row
+                self.accept[state] = label_id
+
+    def alphabet(self) -> set[str]:
+        return {chr(code) for code, symbol_class in enumerate(self.classes) if symbol_class}
+
+    def step(self, state: int, symbol: str) -> int:
+        code = ord(symbol)
+        symbol_class = self.classes[code] if code < len(self.classes) else 0
+        return self.transitions[state * self.n_classes + symbol_class]
+
+    def label(self, state: int) -> str | None:
+        label_id = self.accept[state]
+        return self.labels[label_id] if label_id >= 0 else None
+
+    def to_dfa(self) -> DFA[int]:
+        # a dfa whose transitions and final states are read straight from the table, nothing is copied
+        return DFA(S=self.alphabet(), K=range(len(self.accept)), q0=self.start,
+                   d=_Transitions(self), F=_FinalStates(self))
+
+    def to_bytes(self) -> bytes:
+        labels = json.dumps(self.labels).encode()
+        header = HEADER.pack(MAGIC, len(self.classes), self.n_classes, len(self.accept),
+                             self.start, self.sink, len(labels))
+        return b''.join((header, array('i', self.classes).tobytes(), array('i', self.transitions).tobytes(),
+                         array('i', self.accept).tobytes(), labels))
+
+    @staticmethod
+    def assemble(path: str, classes: Sequence[int], n_classes: int, n_states: int, start: int, sink: int,
+                 labels: list[str], transitions: BinaryIO, accept: BinaryIO) -> None:
+        # write a table file from rows that were streamed to disk, the row files are copied in chunks
+        labels_data = json.dumps(labels).encode()
+        with open(path, 'wb') as file:
+            file.write(HEADER.pack(MAGIC, len(classes), n_classes, n_states, start, sink, len(labels_data)))
+            file.write(array('i', classes).tobytes())
+            for rows in (transitions, accept):
+                rows.seek(0)
+                shutil.copyfileobj(rows, file)
+            file.write(labels_data)
+
+    @staticmethod
+    def from_buffer(buffer: memoryview, owner: Any = None) -> 'DFATable':
+        # zero-copy view over a serialized table, owner is kept alive as long as the table
+        magic, n_codes, n_classes, n_states, start, sink, labels_size = HEADER.unpack_from(buffer)
+        if magic != MAGIC:
+            raise ValueError('The buffer does not hold a DFA table')
+        offset = HEADER.size
+        views = []
+        for size in (n_codes, n_states * n_classes, n_states):
+            views.append(buffer[offset:offset + 4 * size].cast('i'))
+            offset += 4 * size
+        labels = json.loads(bytes(buffer[offset:offset + labels_size]))
+        classes, transitions, accept = views
+        return DFATable(classes=classes, transitions=transitions, accept=accept,
+                        labels=labels, start=start, sink=sink,
+                        _buffer=(buffer, owner))
+
+    def publish(self, name: str | None = None) -> SharedMemory:
+        # copy the table into a new shared memory block; the caller owns the block and must unlink it
+        data = self.to_bytes()
+        shared_memory = SharedMemory(name=name, create=True, size=len(data))
+        shared_memory.buf[:len(data)] = data
+        return shared_memory
+
+    @staticmethod
+    def attach(name: str) -> 'DFATable':
+        # map a table published by another process, the arrays are views into the shared block
+        if sys.version_info >= (3, 13):
+            shared_memory = SharedMemory(name=name, track=False)
+        else:
+            shared_memory = _attach_untracked(name)
+        return DFATable.from_buffer(shared_memory.buf, shared_memory)
+
+    def save(self, path: str) -> None:
+        with open(path, 'wb') as file:
+            file.write(self.to_bytes())
+
+    @staticmethod
+    def load(path: str) -> 'DFATable':
+        with open(path, 'rb') as file:
+            mapping = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        return DFATable.from_buffer(memoryview(mapping), mapping)
+
+    def close(self) -> None:
+        # release the views before closing the shared memory block or the mapping they point into
+        if self._buffer is None:
+            return
+        buffer, owner = self._buffer
+        for view in (self.classes, self.transitions, self.accept):
+            view.release()
+        buffer.release()
+        if owner is not None:
+            owner.close()
+        self._buffer = None
+
+
+_attach_lock = threading.Lock()
+
+
+def _attach_untracked(name: str) -> SharedMemory:
+    # Before 3.13 opening a block registers it with the resource tracker, which unlinks it when its processes
+    # exit; a forked worker shares the tracker of the publisher, so unregistering after the fact would drop the
+    # publisher's own registration. The registration of the block is skipped instead, in this thread only.
+    register, thread = resource_tracker.register, threading.get_ident()
+
+    def register_others(resource: str, resource_type: str) -> None:
+        if resource_type != 'shared_memory' or threading.get_ident() != thread:
+            register(resource, resource_type)
+
+    with _attach_lock:
+        resource_tracker.register = register_others
+        try:
+            return SharedMemory(name=name)
+        finally:
+            resource_tracker.register = register
+
+
+class _Transitions(Mapping):
+    def __init__(self, table: DFATable) -> None:
+        self.table = table
+        self.symbols = sorted(table.alphabet())
+
+    def __getitem__(self, key: tuple[int, str]) -> int:
+        state, symbol = key
+        code = ord(symbol)
+        if code >= len(self.table.classes) or not self.table.classes[code] or not 0 <= state < len(self.table.accept):
+            raise KeyError(key)
+        return self.table.step(state, symbol)
+
+    def __iter__(self):
+        return ((state, symbol) for state in range(len(self.table.accept)) for symbol in self.symbols)
+
+    def __len__(self) -> int:
+        return len(self.table.accept) * len(self.symbols)
+
+
+class _FinalStates(Set):
+    def __init__(self, table: DFATable) -> None:
+        self.table = table
+
+    def __contains__(self, state: object) -> bool:
+        return isinstance(state, int) and 0 <= state < len(self.table.accept) and self.table.accept[state] >= 0
+
+    def __iter__(self):
+        return (state for state, label_id in enumerate(self.table.accept) if label_id >= 0)
+
+    def __len__(self) -> int:
+        return sum(1 for label_id in self.table.accept if label_id >= 0)
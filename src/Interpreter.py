@@ -1,12 +1,14 @@
 from src.Lexer import Lexer
 from src.Parser import Parser
-from src.Spec import SPEC
+from src.Spec import SKIP, SPEC
 
 
 class Interpreter:
-    def __init__(self, input):
+    def __init__(self, input, stats=False):
+        # input is the source text, or its bytes (e.g. a memory-mapped file) which are lexed in place
         self.input = input
-        tokens = Lexer(SPEC).lex(input)
+        self.lexer = Lexer(SPEC, stats=stats, skip=SKIP)
+        tokens = self.lexer.tokenize(input)
         self.ast = Parser(tokens).parse()
 
     def display(self, lst):
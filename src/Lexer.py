@@ -1,22 +1,113 @@
+import json
+import mmap
+from array import array
+from bisect import bisect_left
+from collections import deque
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, asdict
+from itertools import accumulate, pairwise
+from operator import itemgetter
+from time import perf_counter
+from typing import Any, TextIO
+
 from src.DFA import DFA
+from src.DFATable import DFATable
 from src.NFA import NFA, EPSILON, SINK_STATE
+from src.ReBackend import ReBackend, translate_rule
 from src.Regex import parse_regex
+from src.TDFA import TDFA
+from src.TokenStream import LexError, LineIndex, TokenStream
+
+# how much of a file object iter_tokens reads at a time
+CHUNK_SIZE = 1 << 16
+NEW_LINE = ord('\n')
+
+
+def _compile_rule(regex: str) -> DFA[int]:
+    # runs in the worker processes of the parallel compilation, so it has to live at module level
+    return parse_regex(regex).thompson().reduce().subset_construction().minimize().trim()
+
+
+# the lexer of a worker process of lex_parallel, rebuilt once per process from the serialized table
+_worker_lexer: 'Lexer | None' = None
+
+
+def _load_worker_lexer(table: bytes, skip: frozenset[str]) -> None:
+    global _worker_lexer
+    _worker_lexer = Lexer.from_table(DFATable.from_buffer(memoryview(table)), skip)
+
+
+def _lex_chunk(word: str) -> tuple[bytes, bytes, bytes] | None:
+    # the columns of the token stream go back as bytes, which pickle much faster than the tuples
+    try:
+        tokens = _worker_lexer.tokenize(word)
+    except ValueError:
+        return None
+    return tokens.kinds.tobytes(), tokens.starts.tobytes(), tokens.lengths.tobytes()
+
+
+@dataclass
+class LexerStats:
+    # Construction statistics of a Lexer, times are in seconds. The per-phase times and the nfa sizes are
+    # only known for the serial pipeline, the parallel one reports the wall time of its rule compilation.
+    rules: int = 0
+    parse_time: float = 0.0
+    thompson_time: float = 0.0
+    reduce_time: float = 0.0
+    rule_compile_time: float = 0.0
+    nfa_states: int = 0
+    nfa_edges: int = 0
+    subset_construction_time: float = 0.0
+    dfa_states: int = 0
+    alphabet_size: int = 0
+    peak_subset_size: int = 0
+
+    def to_json(self) -> str:
+        return json.dumps(asdict(self), indent=2)
 
 
 class Lexer:
-    def __init__(self, spec: list[tuple[str, str]]) -> None:
+    def __init__(self, spec: list[tuple[str, str]], workers: int | None = None, stats: bool = False,
+                 skip: Iterable[str] = (), backend: str = 'dfa') -> None:
         # initialisation should convert the specification to a dfa which will be used in the lex method
-        self.map_lexemes: dict[frozenset[int], str] = {}
-        self.dfa = self._generate_dfa(spec)
+        # with workers set, every rule is compiled on its own in a process pool and the results are combined
+        # with stats set, the construction is measured into self.stats, otherwise nothing is timed
+        # the tokens of the lexemes in skip are matched as usual but dropped by the scan, they are never built
+        # with backend 're', lex matches with a python pattern compiled from the spec (see ReBackend), the
+        # dfa stays the reference: it is still built, and reports the errors
+        if backend not in ('dfa', 're'):
+            raise ValueError(f'Unknown lexer backend {backend}')
+        self.stats = LexerStats(rules=len(spec)) if stats else None
+        self.skip = frozenset(skip)
+        self.backend = backend
+        self.map_lexemes: dict[int | tuple[int, int], str] = {}
+        self.spec = list(spec)
+        # every rule has an id that never changes, its priority is its rank in the spec: the final items of
+        # the automata (nfa states, or (rule, state) pairs of the product) are mapped to the id of their rule
+        self.rule_ids = list(range(len(spec)))
+        self.rule_ranks = {rule: rule for rule in self.rule_ids}
+        self.item_rules: dict[int | tuple[int, int], int] = {}
+        self.next_rule = len(spec)
+        self.nfa: NFA[int] | None = None
+        self.rule_states: list[range] = []
+        self.next_nfa_state = 1
+        self.rule_dfas: dict[int, DFA[int]] | None = None
+        self.rule_tdfas: dict[str, TDFA] = {}
+        self.dfa = self._generate_dfa(spec) if workers is None else self._generate_product_dfa(spec, workers)
+        self._update_stats()
+        self._compile_table()
 
     def _generate_dfa(self, spec: list[tuple[str, str]]) -> DFA[frozenset[int]]:
         # Generate the DFA from the specification
         S, K, d, F = set(), {0}, {}, set()
         current_states_size = 1
         for lexeme, regex in spec:
-            nfa = parse_regex(regex).thompson()
+            nfa = self._compile_fragment(regex)
+            span = max(nfa.K) + 1
             nfa.remap_states(lambda x: x + current_states_size)
-            current_states_size += len(nfa.K)
+            self.rule_states.append(range(current_states_size, current_states_size + span))
+            current_states_size += span
             S.update(nfa.S)
             K.update(nfa.K)
             d.update(nfa.d)
@@ -26,38 +117,565 @@ class Lexer:
                 d.update({(0, EPSILON): {nfa.q0}})
             F.update(nfa.F)
             self.map_lexemes.update({final_state: lexeme for final_state in nfa.F})
-        return NFA(S, K, 0, d, F).subset_construction()
+            self.item_rules.update({final_state: len(self.rule_states) - 1 for final_state in nfa.F})
+        self.nfa = NFA(S, K, 0, d, F)
+        self.next_nfa_state = current_states_size
+        if self.stats is None:
+            return self.nfa.subset_construction()
+        started = perf_counter()
+        dfa = self.nfa.subset_construction()
+        self.stats.subset_construction_time = perf_counter() - started
+        return dfa
+
+    def _compile_fragment(self, regex: str) -> NFA[int]:
+        if self.stats is None:
+            return parse_regex(regex).thompson().reduce()
+        started = perf_counter()
+        parsed = parse_regex(regex)
+        parsed_at = perf_counter()
+        nfa = parsed.thompson()
+        built_at = perf_counter()
+        nfa = nfa.reduce()
+        self.stats.parse_time += parsed_at - started
+        self.stats.thompson_time += built_at - parsed_at
+        self.stats.reduce_time += perf_counter() - built_at
+        return nfa
+
+    def _generate_product_dfa(self, spec: list[tuple[str, str]], workers: int) -> DFA[frozenset[tuple[int, int]]]:
+        # Compile each rule to its own minimal DFA and merge them with a lazy product construction.
+        # The final states are keyed by (rule index, state), so the min() in lex still picks the first rule
+        regexes = [regex for _, regex in spec]
+        started = perf_counter()
+        if workers > 1 and len(spec) > 1:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                rule_dfas = list(executor.map(_compile_rule, regexes, chunksize=max(1, len(spec) // (4 * workers))))
+        else:
+            rule_dfas = [_compile_rule(regex) for regex in regexes]
+        for index, ((lexeme, _), rule_dfa) in enumerate(zip(spec, rule_dfas)):
+            self.map_lexemes.update({(index, final_state): lexeme for final_state in rule_dfa.F})
+            self.item_rules.update({(index, final_state): index for final_state in rule_dfa.F})
+        self.rule_dfas = dict(enumerate(rule_dfas))
+        if self.stats is None:
+            return DFA.product(rule_dfas)
+        compiled_at = perf_counter()
+        dfa = DFA.product(rule_dfas)
+        self.stats.rule_compile_time = compiled_at - started
+        self.stats.subset_construction_time = perf_counter() - compiled_at
+        return dfa
+
+    def add_rule(self, lexeme: str, regex: str, priority: int | None = None) -> None:
+        # Hot-add a rule without rebuilding the lexer. The priority is the position of the rule in the spec
+        # (lower wins ties), by default the rule goes last. Only the DFA states that contain states of the
+        # new rule are determinized, every other state reached from them keeps its transitions and its row.
+        if self.nfa is None and self.rule_dfas is None:
+            raise ValueError('A lexer created from a table cannot be changed')
+        if self.backend == 're':
+            translate_rule(lexeme, regex)
+        priority = len(self.spec) if priority is None else priority
+        if not 0 <= priority <= len(self.spec):
+            raise ValueError(f'Priority {priority} is out of range for {len(self.spec)} rules')
+        rule = self.next_rule
+        if self.rule_dfas is None:
+            rule_states = self._add_fragment(priority, rule, lexeme, self._compile_fragment(regex))
+            start = frozenset(self.nfa.epsilon_closure(self.nfa.q0))
+            affected = lambda state: any(item in rule_states for item in state)
+            step, alphabet = self.nfa.step, set(self.nfa.S)
+        else:
+            rule_dfa = _compile_rule(regex)
+            self.rule_dfas[rule] = rule_dfa
+            self.map_lexemes.update({(rule, final_state): lexeme for final_state in rule_dfa.F})
+            self.item_rules.update({(rule, final_state): rule for final_state in rule_dfa.F})
+            start = self.dfa.q0 | {(rule, rule_dfa.q0)}
+            affected = lambda state: any(index == rule for index, _ in state)
+            step = lambda state, symbol: DFA.product_step(self.rule_dfas, state, symbol)
+            alphabet = self.dfa.S | rule_dfa.S
+        self.next_rule += 1
+        self.spec.insert(priority, (lexeme, regex))
+        self.rule_ids.insert(priority, rule)
+        self.rule_ranks = {rule_id: rank for rank, rule_id in enumerate(self.rule_ids)}
+        self._redeterminize(start, affected, step, alphabet)
+        self._update_stats()
+
+    def remove_rule(self, lexeme: str) -> None:
+        # Remove every rule of the given lexeme. Dropping the rule's states from each DFA state
+        # commutes with the transitions, so no determinization is needed at all
+        indices = [index for index, (name, _) in enumerate(self.spec) if name == lexeme]
+        if not indices:
+            raise ValueError(f'No rule for lexeme {lexeme}')
+        for index in reversed(indices):
+            rule = self.rule_ids.pop(index)
+            if self.rule_dfas is None:
+                removed = self.rule_states.pop(index)
+                self.nfa.d[(self.nfa.q0, EPSILON)].difference_update(
+                    [state for state in self.nfa.d[(self.nfa.q0, EPSILON)] if state in removed])
+                for key in [key for key in self.nfa.d if key[0] in removed]:
+                    del self.nfa.d[key]
+                self.nfa.K = {state for state in self.nfa.K if state not in removed}
+                self.nfa.F = {state for state in self.nfa.F if state not in removed}
+                self.nfa.S = {symbol for (_, symbol) in self.nfa.d if symbol != EPSILON}
+                is_removed, alphabet = removed.__contains__, self.nfa.S
+            else:
+                del self.rule_dfas[rule]
+                is_removed = lambda item: item[0] == rule
+                alphabet = set().union(*(rule_dfa.S for rule_dfa in self.rule_dfas.values()))
+            self.map_lexemes = {item: name for item, name in self.map_lexemes.items() if not is_removed(item)}
+            self.item_rules = {item: owner for item, owner in self.item_rules.items() if not is_removed(item)}
+            self.spec.pop(index)
+            self.rule_ranks = {rule_id: rank for rank, rule_id in enumerate(self.rule_ids)}
+            self._project(is_removed, alphabet)
+        self._update_stats()
+
+    def _update_stats(self) -> None:
+        if self.stats is None:
+            return
+        self.stats.rules = len(self.spec)
+        self.stats.dfa_states = len(self.dfa.K)
+        self.stats.alphabet_size = len(self.dfa.S)
+        self.stats.peak_subset_size = max(map(len, self.dfa.K))
+        if self.nfa is not None:
+            self.stats.nfa_states = len(self.nfa.K)
+            self.stats.nfa_edges = sum(map(len, self.nfa.d.values()))
+
+    def _compile_table(self) -> None:
+        # lex scans the integer table of the dfa, with the lexeme of every state resolved once in a dense list
+        # state_rows maps every dfa state to its row, so a change of the spec only rewrites the rows it touches
+        self.state_rows = DFATable.number_states(self.dfa)
+        self._init_tables(DFATable.from_dfa(self.dfa, self.state_lexeme, numbering=self.state_rows))
+
+    def _init_tables(self, table: DFATable) -> None:
+        # the state of the scan derived from the table, for a compiled spec and for from_table alike
+        self.table = table
+        self.lexemes = [table.label(state) for state in range(len(table.accept))]
+        self.skipped = [lexeme in self.skip for lexeme in self.lexemes]
+        self.safe_pairs: dict[tuple[str, str], bool] = {}
+        self.re_backend = ReBackend(self.spec) if self.backend == 're' else None
+
+    def _update_table(self, states: list[frozenset]) -> None:
+        # write the rows of the given dfa states, the states without a row are appended to the table
+        for state in states:
+            if state not in self.state_rows:
+                self.state_rows[state] = len(self.lexemes)
+                self.lexemes.append(None)
+                self.skipped.append(False)
+        rows, symbols = self.state_rows, sorted(self.dfa.S)
+        self.table.update_rows(
+            {rows[state]: {symbol: rows[next_state] for symbol in symbols
+                           if (next_state := self.dfa.d.get((state, symbol), SINK_STATE)) != SINK_STATE}
+             for state in states},
+            {rows[state]: self.state_lexeme(state) for state in states})
+        self.table.start = rows[self.dfa.q0]
+        for state in states:
+            row = rows[state]
+            self.lexemes[row] = self.table.label(row)
+            self.skipped[row] = self.lexemes[row] in self.skip
+        self.safe_pairs = {}
+        self.re_backend = ReBackend(self.spec) if self.backend == 're' else None
+
+    def _add_fragment(self, priority: int, rule: int, lexeme: str, fragment: NFA[int]) -> range:
+        # the fragment gets fresh nfa states after all the others, the states of the other rules never move
+        span = max(fragment.K) + 1
+        offset = self.next_nfa_state
+        self.next_nfa_state += span
+        fragment.remap_states(lambda state: state + offset)
+        rule_states = range(offset, offset + span)
+        self.rule_states.insert(priority, rule_states)
+        self.nfa.S.update(fragment.S)
+        self.nfa.K.update(fragment.K)
+        self.nfa.F.update(fragment.F)
+        self.nfa.d.update(fragment.d)
+        self.nfa.d.setdefault((self.nfa.q0, EPSILON), set()).add(fragment.q0)
+        self.map_lexemes.update({final_state: lexeme for final_state in fragment.F})
+        self.item_rules.update({final_state: rule for final_state in fragment.F})
+        return rule_states
+
+    def _redeterminize(self, start: frozenset, affected: Callable[[frozenset], bool],
+                       step: Callable[[frozenset, str], frozenset], alphabet: set[str]) -> None:
+        # Subset construction from the new initial state that stops at the states not affected by the change:
+        # those are old states, and so is everything reachable from them, so their transitions are reused.
+        # An old state has no transition on a symbol that is new to the dfa, it goes to the sink.
+        # The old states that are no longer reachable are left in place, nothing ever enters them again.
+        transitions = self.dfa.d
+        explored = [start]
+        seen = {start}
+        for current in explored:
+            for symbol in alphabet:
+                next_state = step(current, symbol)
+                transitions[(current, symbol)] = next_state
+                if next_state not in seen and affected(next_state):
+                    seen.add(next_state)
+                    explored.append(next_state)
+                self.dfa.K.add(next_state)
+        final_items = self.map_lexemes.keys()
+        self.dfa.q0 = start
+        self.dfa.S = set(alphabet)
+        self.dfa.K.update(explored)
+        self.dfa.F.update(state for state in explored if not final_items.isdisjoint(state))
+        self._update_table(explored)
 
-    def lex(self, word: str) -> list[tuple[str, str]]:
+    def _project(self, is_removed: Callable[[Any], bool], alphabet: set[str]) -> None:
+        # Drop the items of a removed rule from the dfa states that hold them. Those states are reached from
+        # the initial state through each other only, so they are found from there and no other state changes.
+        # A projected state that is new takes over the row of its state, the others are already in the table.
+        transitions, symbols = self.dfa.d, self.dfa.S
+        affected = lambda state: any(map(is_removed, state))
+        explored = [self.dfa.q0] if affected(self.dfa.q0) else []
+        seen = set(explored)
+        for current in explored:
+            for symbol in symbols:
+                next_state = transitions.get((current, symbol))
+                if next_state is not None and next_state not in seen and affected(next_state):
+                    seen.add(next_state)
+                    explored.append(next_state)
+        projected = {state: frozenset(item for item in state if not is_removed(item)) for state in explored}
+        final_items = self.map_lexemes.keys()
+        changed = []
+        for state, projected_state in projected.items():
+            row = self.state_rows.pop(state)
+            if projected_state not in self.state_rows:
+                self.state_rows[projected_state] = row
+                changed.append(projected_state)
+            self.dfa.K.discard(state)
+            self.dfa.F.discard(state)
+            for symbol in symbols:
+                next_state = transitions.pop((state, symbol), None)
+                if next_state is not None and symbol in alphabet:
+                    transitions[(projected_state, symbol)] = projected.get(next_state, next_state)
+            self.dfa.K.add(projected_state)
+            if not final_items.isdisjoint(projected_state):
+                self.dfa.F.add(projected_state)
+        self.dfa.q0 = projected.get(self.dfa.q0, self.dfa.q0)
+        self.dfa.S = set(alphabet)
+        self._update_table(changed)
+
+    def state_lexeme(self, state: frozenset | int) -> str | None:
+        # the lexeme of a dfa state: if it contains the final states of several rules, the longest
+        # substring satisfies multiple regexes, so the min (the rule that comes first) wins
+        # a lexer built from a table has no automata of its own, its dfa states are the rows of the table
+        if self.nfa is None and self.rule_dfas is None:
+            return self.table.label(state)
+        final_items = self.map_lexemes.keys() & state
+        if not final_items:
+            return None
+        rules, ranks = self.item_rules, self.rule_ranks
+        return self.map_lexemes[min(final_items, key=lambda item: ranks[rules[item]])]
+
+    def to_table(self) -> DFATable:
+        # the integer tables of the compiled dfa, ready to be published to other processes
+        if self.nfa is None and self.rule_dfas is None:
+            return self.table
+        return DFATable.from_dfa(self.dfa, self.state_lexeme)
+
+    @classmethod
+    def from_table(cls, table: DFATable, skip: Iterable[str] = ()) -> 'Lexer':
+        # a lexer that scans straight from a (possibly shared) table; it has no spec, so it cannot be changed
+        lexer = cls.__new__(cls)
+        lexer.stats = None
+        lexer.skip = frozenset(skip)
+        lexer.backend = 'dfa'
+        lexer.map_lexemes = {}
+        lexer.spec = []
+        lexer.nfa = None
+        lexer.rule_ids = []
+        lexer.rule_ranks = {}
+        lexer.item_rules = {}
+        lexer.rule_states = []
+        lexer.rule_dfas = None
+        lexer.rule_tdfas = {}
+        lexer.dfa = table.to_dfa()
+        lexer._init_tables(table)
+        return lexer
+
+    def group_spans(self, lexeme: str, matched_str: str, offset: int = 0) -> dict[str, tuple[int, int] | None]:
+        # The spans of the named groups in a token, found by running the tagged dfa of its rule over the token.
+        # The first rule of the lexeme that matches the whole token is the one the lexer picked
+        for name, regex in self.spec:
+            if name != lexeme:
+                continue
+            if regex not in self.rule_tdfas:
+                self.rule_tdfas[regex] = parse_regex(regex).tdfa()
+            spans = self.rule_tdfas[regex].match(matched_str, offset)
+            if spans is not None:
+                return spans
+        raise ValueError(f'No rule for lexeme {lexeme} matches {matched_str!r}')
+
+    def lex(self, word: str, groups: bool = False) -> list[tuple]:
         # this method splits the lexer into tokens based on the specification
-        lexer_output = []
-        position, line = [0], 0
-        EOF = len(word) - 1 if word else 0
-
-        def dfs(state: frozenset[int], current_word: str, current_str: str, matched_str: str, lexeme: str) -> tuple[str, str]:
-            nfa_final_state = list(set(self.map_lexemes.keys()).intersection(state))
-            if nfa_final_state:
-                # if multiple elements in the intersection, the longest substring satisfies multiple regexes, get the min.
-                lexeme = self.map_lexemes[min(nfa_final_state)]
-                matched_str = current_str
-            if state == SINK_STATE:
-                position[0] += len(matched_str) if matched_str else len(current_str) - 1
-                return matched_str, lexeme
-            if current_word:
-                next_state = self.dfa.d.get((state, current_word[0]), frozenset())
-                matched_str, lexeme = dfs(next_state, current_word[1:], current_str + current_word[0], matched_str, lexeme)
-            return matched_str, lexeme
-
-        while word:
-            matched_str, lexeme = dfs(self.dfa.q0, word, '', '', '')
+        # with groups set, every token also gets the spans of its named groups in the word (see group_spans)
+        lexer_output = self.re_backend.lex(word, self.skip) if self.re_backend is not None else None
+        if lexer_output is None:
+            lexer_output = list(self.iter_tokens((word,)))
+        if lexer_output and not lexer_output[-1][0]:
+            # the error entry ends the stream and replaces the tokens
+            return lexer_output[-1:]
+        if groups:
+            if self.skip:
+                raise ValueError('The group spans need the offsets of all the tokens, so no lexeme can be skipped')
+            offsets = accumulate((len(matched_str) for _, matched_str in lexer_output), initial=0)
+            return [(lexeme, matched_str, self.group_spans(lexeme, matched_str, offset))
+                    for (lexeme, matched_str), offset in zip(lexer_output, offsets)]
+        return lexer_output
+
+    def check_backend(self, corpus: Iterable[str]) -> list[str]:
+        # Differential test of the re backend against the automata: the words of the corpus on which their
+        # tokens (or their verdict that the word has an error) differ. The lexer need not use the re backend
+        re_backend = self.re_backend or ReBackend(self.spec)
+        mismatches = []
+        for word in corpus:
+            expected = list(self.iter_tokens((word,)))
+            if expected and not expected[-1][0]:
+                expected = None
+            if re_backend.lex(word, self.skip) != expected:
+                mismatches.append(word)
+        return mismatches
+
+    def lex_parallel(self, word: str, workers: int | None = None, chunk_size: int = 1 << 20) -> list[tuple[str, str]]:
+        # the tokens of tokenize_parallel as the list of lex, with the error entry of lex on a lexical error
+        try:
+            return self.tokenize_parallel(word, workers, chunk_size)[:]
+        except ValueError:
+            return self.lex(word)
+
+    def tokenize_parallel(self, word: str, workers: int | None = None, chunk_size: int = 1 << 20) -> TokenStream:
+        # Tokenize a large word in a process pool, split in chunks of about chunk_size at safe boundaries (see
+        # split_points). The chunks are lexed from the start state on their own, so the tokens are the same as
+        # the ones of tokenize. The columns of the chunks are joined into one stream, only the starts are
+        # shifted by the offset of their chunk; if a chunk has an error, the word is tokenized again serially
+        # for the exact message
+        points = self.split_points(word, chunk_size)
+        if len(points) <= 2:
+            return self.tokenize(word)
+        tokens = TokenStream(word, self.table.labels, self.skip)
+        with ProcessPoolExecutor(max_workers=workers, initializer=_load_worker_lexer,
+                                 initargs=(self.table.to_bytes(), self.skip)) as executor:
+            chunks = executor.map(_lex_chunk, (word[start:end] for start, end in pairwise(points)))
+            for offset, columns in zip(points, chunks):
+                if columns is None:
+                    return self.tokenize(word)
+                kinds, starts, lengths = columns
+                tokens.kinds.frombytes(kinds)
+                tokens.lengths.frombytes(lengths)
+                if offset:
+                    tokens.starts.extend(map(offset.__add__, array('I', starts)))
+                else:
+                    tokens.starts.frombytes(starts)
+        return tokens
+
+    def split_points(self, word: str, chunk_size: int) -> list[int]:
+        # Offsets to cut the word at, from 0 to len(word), about chunk_size apart. A cut between the
+        # characters a and b is safe if reading a then b leads every state of the dfa to the sink: no token
+        # can contain "ab", so the token that holds a ends right after it and lex restarts from the start
+        # state there. For the spec that is where a run of newlines or white spaces ends.
+        points = [0]
+        target = chunk_size
+        while target < len(word):
+            for point in range(max(target, points[-1] + 1), len(word)):
+                if self.is_safe_cut(word, point):
+                    points.append(point)
+                    break
+            else:
+                break
+            target = points[-1] + chunk_size
+        points.append(len(word))
+        return points
+
+    def is_safe_cut(self, word: str, point: int) -> bool:
+        # whether no token can contain both word[point - 1] and word[point] (see split_points)
+        pair = word[point - 1:point + 1]
+        if pair not in self.safe_pairs:
+            table = self.table
+            self.safe_pairs[pair] = all(table.step(table.step(state, pair[0]), pair[1]) == table.sink
+                                        for state in range(len(table.accept)))
+        return self.safe_pairs[pair]
+
+    def relex(self, tokens: list[tuple[str, str]], edit: tuple[int, int, str]) \
+            -> tuple[list[tuple[str, str]], tuple[int, int, int]]:
+        # Update the tokens of lex after an edit (offset, removed length, inserted text) of their word.
+        # Returns the new tokens and the changed range (first, old_end, new_end): tokens[first:old_end] were
+        # replaced by new_tokens[first:new_end]. Scanning restarts at the last safe cut before the edit, since
+        # the lookahead of the tokens in front of it could not reach the edit, and stops at the first token
+        # boundary after the edit that was also a boundary before it: the dfa is back at its start state on
+        # the same text there, so the rest of the old tokens are kept. An error relexes the whole word.
+        if self.skip:
+            raise ValueError('Relexing needs the text of all the tokens, so no lexeme can be skipped')
+        offset, removed, inserted = edit
+        old_word = ''.join(map(itemgetter(1), tokens))
+        word = old_word[:offset] + inserted + old_word[offset + removed:]
+        starts = list(accumulate(map(len, map(itemgetter(1), tokens)), initial=0))
+        delta = len(inserted) - removed
+
+        restart = offset - 1
+        while restart > 0 and not self.is_safe_cut(old_word, restart):
+            restart -= 1
+        first = bisect_left(starts, max(restart, 0))
+        new_tokens, start, old_end = [], starts[first], first
+        while start < len(word):
+            if start >= offset + len(inserted):
+                old_end = bisect_left(starts, start - delta, old_end)
+                if old_end < len(starts) and starts[old_end] == start - delta:
+                    break
+            lexeme, end = self._munch(word, start)
+            if end == start:
+                lexer_output = self.lex(word)
+                return lexer_output, (0, len(tokens), len(lexer_output))
+            new_tokens.append((lexeme, word[start:end]))
+            start = end
+        else:
+            old_end = len(tokens)
+
+        # tokens that were rescanned but came out the same are not part of the change
+        unchanged = 0
+        while (unchanged < len(new_tokens) and first + unchanged < old_end
+               and new_tokens[unchanged] == tokens[first + unchanged]):
+            unchanged += 1
+        lexer_output = tokens[:first] + new_tokens + tokens[old_end:]
+        return lexer_output, (first + unchanged, old_end, first + len(new_tokens))
+
+    def _munch(self, word: str, start: int) -> tuple[str, int]:
+        # the lexeme and the end of the longest token at start, the end is start if no token matches
+        table, lexemes = self.table, self.lexemes
+        state, lexeme, end = table.start, '', start
+        for index in range(start, len(word)):
+            state = table.step(state, word[index])
+            if lexemes[state] is not None:
+                lexeme, end = lexemes[state], index + 1
+            elif state == table.sink:
+                break
+        return lexeme, end
+
+    def iter_tokens(self, source: TextIO | Iterable[str]) -> Iterator[tuple[str, str]]:
+        # Lex a text file object (read in CHUNK_SIZE pieces) or an iterable of chunks, yielding every token
+        # as soon as it is complete. A lexical error is yielded as the last item, as lex reports it.
+        # Maximal munch over indices into a buffer: scan from start until the dfa dies or the input ends,
+        # remembering the end and the lexeme of the last final state. The buffer is cut at start whenever a
+        # chunk is appended, so it only holds the current partial token and the lookahead past its end.
+        # position is the column reported by errors, it advances past every token that was ended by the sink
+        # and is reset by a '\n' token
+        chunks = iter(lambda: source.read(CHUNK_SIZE), '') if hasattr(source, 'read') else iter(source)
+        table, lexemes, skip = self.table, self.lexemes, self.skip
+        classes, transitions, n_codes, n_classes = table.classes, table.transitions, len(table.classes), table.n_classes
+        sink = table.sink
+        buffer, exhausted = '', False
+        position, line, start, size = 0, 0, 0, 0
+        while True:
+            state, lexeme, end, index = table.start, '', start, start
+            while True:
+                if index == size:
+                    chunk = None if exhausted else next(chunks, None)
+                    if chunk is None:
+                        exhausted = True
+                        break
+                    buffer, index, end, start = buffer[start:] + chunk, index - start, end - start, 0
+                    size = len(buffer)
+                    continue
+                code = ord(buffer[index])
+                state = transitions[state * n_classes + (classes[code] if code < n_codes else 0)]
+                index += 1
+                found = lexemes[state]
+                if found is not None:
+                    lexeme, end = found, index
+                elif state == sink:
+                    position += end - start if end > start else index - start - 1
+                    break
+            if start == size:
+                return
+            matched_str = buffer[start:end]
             if matched_str == '\n':
                 line += 1
-                position[0] = 0
-            EOF -= len(matched_str)
+                position = 0
             if not matched_str:
-                if EOF == 0 and word[-1] in self.dfa.S:
-                    return [(matched_str, f'No viable alternative at character EOF, line {line}')]
-                return [(matched_str, f'No viable alternative at character {position[0]}, line {line}')]
-            lexer_output.append((lexeme, matched_str))
-            word = word.replace(matched_str, '', 1)
-        return lexer_output
+                # the error is reported at EOF when the character that failed is the last one of the input
+                while size - start < 2 and not exhausted:
+                    chunk = next(chunks, None)
+                    if chunk is None:
+                        exhausted = True
+                    else:
+                        buffer = buffer[start:] + chunk
+                        start, size = 0, len(buffer)
+                if exhausted and size - start == 1 and buffer[start] in self.dfa.S:
+                    yield matched_str, f'No viable alternative at character EOF, line {line}'
+                else:
+                    yield matched_str, f'No viable alternative at character {position}, line {line}'
+                return
+            if lexeme not in skip:
+                yield lexeme, matched_str
+            start = end
+
+    def scan(self, data: str | bytes | bytearray | memoryview | mmap.mmap) -> Iterator[tuple[str, int, int]]:
+        # Lex in place, e.g. a memory-mapped file, yielding (lexeme, start, end) offsets into data so the text
+        # of a token is only decoded if it is needed (see token_text). For bytes every byte is one character,
+        # which holds for the ascii alphabet of the spec. A lexical error raises a ValueError with the message
+        # lex would return
+        lexemes = self.lexemes
+        for state, start, end in self._scan(data):
+            yield lexemes[state], start, end
+
+    def tokenize(self, data: str | bytes | bytearray | memoryview | mmap.mmap, recover: bool = False) -> TokenStream:
+        # The tokens of scan as a TokenStream over data, no text is copied. With recover set, a lexical error
+        # does not stop the scan: the characters read by the failed scan and up to the next one that can start
+        # a token are skipped, recorded in the errors of the stream with their position, and lexing goes on
+        # from there.
+        accept = self.table.accept
+        tokens = TokenStream(data, self.table.labels, self.skip)
+        add_kind, add_start, add_length = tokens.kinds.append, tokens.starts.append, tokens.lengths.append
+        skipped_ranges = [] if recover else None
+        for state, start, end in self._scan(data, skipped_ranges):
+            add_kind(accept[state])
+            add_start(start)
+            add_length(end - start)
+        if skipped_ranges:
+            tokens.line_index = LineIndex(data)
+            tokens.errors = [LexError(start, end, *tokens.line_index.locate(start)) for start, end in skipped_ranges]
+        return tokens
+
+    def _scan(self, data: str | bytes | bytearray | memoryview | mmap.mmap,
+              skipped_ranges: list[tuple[int, int]] | None = None) -> Iterator[tuple[int, int, int]]:
+        # The scan of iter_tokens over the character codes of data, without the chunk handling. It yields
+        # the final state of every token with its offsets. A str is scanned through its ascii encoding, or
+        # through its utf-32 code points if it has other characters, so the offsets are the same.
+        # If skipped_ranges is given, errors are appended to it instead of raised (see tokenize)
+        if isinstance(data, str):
+            data = data.encode('ascii') if data.isascii() else memoryview(data.encode('utf-32-le')).cast('I')
+        table, lexemes, skipped = self.table, self.lexemes, self.skipped
+        classes, transitions, n_codes, n_classes = table.classes, table.transitions, len(table.classes), table.n_classes
+        sink = table.sink
+        if skipped_ranges is not None:
+            starts_token = [transitions[table.start * n_classes + symbol_class] != sink
+                            for symbol_class in range(n_classes)]
+        position, line, start, size = 0, 0, 0, len(data)
+        while start < size:
+            state, final, end, index = table.start, sink, start, start
+            while index < size:
+                code = data[index]
+                state = transitions[state * n_classes + (classes[code] if code < n_codes else 0)]
+                index += 1
+                if lexemes[state] is not None:
+                    final, end = state, index
+                elif state == sink:
+                    position += end - start if end > start else index - start - 1
+                    break
+            if end == start and skipped_ranges is not None:
+                # skip what the failed scan read, up to the character that led it to the sink, then to the next
+                # character that the start state has a transition on: every character is read by one failed
+                # scan at most, and an error right after another one extends its range
+                end = max(index - 1 if state == sink else index, start + 1)
+                while end < size and not (data[end] < n_codes and starts_token[classes[data[end]]]):
+                    end += 1
+                if skipped_ranges and skipped_ranges[-1][1] == start:
+                    start = skipped_ranges.pop()[0]
+                skipped_ranges.append((start, end))
+                start = end
+                continue
+            if end == start:
+                if size - start == 1 and chr(data[start]) in self.dfa.S:
+                    raise ValueError(f'No viable alternative at character EOF, line {line}')
+                raise ValueError(f'No viable alternative at character {position}, line {line}')
+            if end - start == 1 and data[start] == NEW_LINE:
+                line += 1
+                position = 0
+            if not skipped[final]:
+                yield final, start, end
+            start = end
+
+    @staticmethod
+    def token_text(data: bytes | bytearray | memoryview | mmap.mmap, start: int, end: int) -> str:
+        return bytes(data[start:end]).decode('ascii')
@@ -1,10 +1,19 @@
-from typing import Any
+import hashlib
+import mmap
+import os
+import struct
+import tempfile
+from array import array
+from typing import Any, Hashable, TYPE_CHECKING
 
 from .DFA import DFA
 from dataclasses import dataclass
 from collections.abc import Callable
 from collections import deque
 
+if TYPE_CHECKING:
+    from .DFATable import DFATable
+
 EPSILON = ''  # this is how epsilon is represented
 SINK_STATE = frozenset() # this is how a sink state is represented in the DFA
 
@@ -32,8 +41,19 @@ class NFA[STATE]:
                 states.add(epsilon_transition)
         return states
 
-    def subset_construction(self) -> DFA[frozenset[STATE]]:
+    def step(self, states: frozenset[STATE], symbol: str) -> frozenset[STATE]:
+        # the subset reached from states on symbol, closed under epsilon transitions
+        next_states: set[STATE] = set()
+        for state in states:
+            for next_state in self.d.get((state, symbol), ()):
+                if next_state not in next_states:
+                    next_states.update(self.epsilon_closure(next_state))
+        return frozenset(next_states) if next_states else SINK_STATE
+
+    def subset_construction(self, progress: Callable[[int, int], None] | None = None) -> DFA[frozenset[STATE]]:
         # convert this nfa to a dfa using the subset construction algorithm
+        # progress, if given, is called after every processed subset with the number of subsets found so far
+        # and the number still waiting to be processed
         initial = self.epsilon_closure(self.q0)
         transition_table: dict[tuple[frozenset[STATE], str], frozenset[Any]] = {}
         states: set[frozenset[STATE]] = {frozenset(initial)}
@@ -41,19 +61,192 @@ class NFA[STATE]:
         while process_states:
             current_subset = process_states.popleft()
             for symbol in self.S:
-                new_state = set()
-                for state in current_subset:
-                    next_state = self.d.get((state, symbol), set())
-                    for s in next_state:
-                        new_state = new_state.union(self.epsilon_closure(s))
-                new_state = frozenset(new_state) if new_state else SINK_STATE
+                new_state = self.step(current_subset, symbol)
                 if new_state not in states:
                     process_states.append(new_state)
                     states.add(new_state)
                 transition_table[(frozenset(current_subset), symbol)] = new_state
+            if progress is not None:
+                progress(len(states), len(process_states))
         final_states = {state for state in states if state.intersection(self.F)}
         return DFA(S=self.S, K=states, q0=frozenset(initial), d=transition_table, F=final_states)
 
+    def subset_construction_on_disk(self, path: str, label: Callable[[frozenset[STATE]], str | None] | None = None,
+                                    batch_size: int = 4096) -> 'DFATable':
+        # Subset construction for dfas that do not fit in memory. The subsets are kept on disk (see _SubsetStore)
+        # and numbered in discovery order, so the worklist is just the range of ids found but not processed yet.
+        # Rows are produced a batch at a time and streamed to disk, then assembled into a DFATable file at path,
+        # which is returned mapped into memory. Subset 1 is always the sink; label names the final subsets.
+        from .DFATable import DFATable
+
+        label = label or (lambda subset: 'final' if not self.F.isdisjoint(subset) else None)
+        states = list(self.K | {self.q0})
+        ids = {state: index for index, state in enumerate(states)}
+        symbols = sorted(self.S)
+        n_classes = len(symbols) + 1
+        classes = array('i', [0]) * (max(map(ord, symbols), default=-1) + 1)
+        for symbol_class, symbol in enumerate(symbols, 1):
+            classes[ord(symbol)] = symbol_class
+        encode = lambda subset: array('i', sorted(ids[state] for state in subset)).tobytes()
+
+        with tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(path))) as directory, \
+                open(os.path.join(directory, 'transitions'), 'w+b') as transitions, \
+                open(os.path.join(directory, 'accept'), 'w+b') as accept:
+            store = _SubsetStore(directory)
+            store.add(encode(self.epsilon_closure(self.q0)))
+            sink = store.add(encode(SINK_STATE))[0]
+            labels: dict[str, int] = {}
+            processed = 0
+            while processed < store.count:
+                batch_end = min(store.count, processed + batch_size)
+                rows = array('i')
+                accepted = array('i')
+                for state_id in range(processed, batch_end):
+                    subset = frozenset(states[index] for index in array('i', store.get(state_id)))
+                    rows.append(sink)
+                    for symbol in symbols:
+                        rows.append(store.add(encode(self.step(subset, symbol)))[0])
+                    subset_label = label(subset)
+                    accepted.append(-1 if subset_label is None else labels.setdefault(subset_label, len(labels)))
+                rows.tofile(transitions)
+                accepted.tofile(accept)
+                processed = batch_end
+            n_states = store.count
+            store.close()
+            DFATable.assemble(path, classes, n_classes, n_states, 0, sink, list(labels), transitions, accept)
+        return DFATable.load(path)
+
+    def remove_epsilons(self) -> 'NFA[STATE]':
+        # Fold the epsilon closures into direct symbol transitions: a state now moves on a symbol to the
+        # closures of everything its own closure moves to. Only the initial state, the final states and the
+        # states with symbol transitions of their own are kept, and final states are never renamed, so any
+        # mapping keyed by them (like Lexer.map_lexemes) still holds for the new nfa.
+        symbol_edges: dict[STATE, list[tuple[str, set[STATE]]]] = {}
+        for (state, symbol), next_states in self.d.items():
+            if symbol != EPSILON:
+                symbol_edges.setdefault(state, []).append((symbol, next_states))
+        kept = {self.q0} | self.F | symbol_edges.keys()
+        closures: dict[STATE, set[STATE]] = {}
+
+        def kept_closure(state: STATE) -> set[STATE]:
+            if state not in closures:
+                closures[state] = {s for s in self.epsilon_closure(state) if s in kept}
+            return closures[state]
+
+        transitions: dict[tuple[STATE, str], set[STATE]] = {}
+        reachable, queue = {self.q0}, deque([self.q0])
+        while queue:
+            state = queue.popleft()
+            moves: dict[str, set[STATE]] = {}
+            for closure_state in self.epsilon_closure(state):
+                for symbol, next_states in symbol_edges.get(closure_state, ()):
+                    targets = moves.setdefault(symbol, set())
+                    for next_state in next_states:
+                        targets.update(kept_closure(next_state))
+            for symbol, targets in moves.items():
+                transitions[(state, symbol)] = targets
+                for target in targets - reachable:
+                    reachable.add(target)
+                    queue.append(target)
+
+        final_states = {state for state in self.F if state in reachable}
+        if not self.F.isdisjoint(self.epsilon_closure(self.q0)):
+            final_states.add(self.q0)
+        # drop the states that can no longer reach a final state
+        predecessors: dict[STATE, set[STATE]] = {}
+        for (state, _), targets in transitions.items():
+            for target in targets:
+                predecessors.setdefault(target, set()).add(state)
+        useful, queue = set(final_states), deque(final_states)
+        while queue:
+            for state in predecessors.get(queue.popleft(), ()):
+                if state not in useful:
+                    useful.add(state)
+                    queue.append(state)
+        transitions = {(state, symbol): targets & useful for (state, symbol), targets in transitions.items()
+                       if state in useful and not targets.isdisjoint(useful)}
+        return NFA(S=set(self.S), K=useful | {self.q0}, q0=self.q0, d=transitions, F=final_states)
+
+    def reduce(self, labels: dict[STATE, Hashable] | None = None) -> 'NFA[STATE]':
+        # Shrink the nfa before determinization: remove the epsilons (which also trims unreachable and useless
+        # states), then merge forward-bisimilar and backward-bisimilar states. Final states are only merged when
+        # they have the same label, so giving each final state its rule keeps the Lexer priorities intact.
+        # Every merged block is named after its smallest state, or after q0 when it holds q0.
+        nfa = self.remove_epsilons()
+        labels = labels or {}
+        nfa = nfa._merge_bisimilar(labels, forward=True)
+        return nfa._merge_bisimilar(labels, forward=False)
+
+    def _merge_bisimilar(self, labels: dict[STATE, Hashable], forward: bool) -> 'NFA[STATE]':
+        # Partition refinement on the transitions (forward) or on the reversed transitions (backward). Every
+        # block is kept consistent: its states have the same signature, the blocks reached by each symbol. When
+        # states move to a new block, only the states with an edge to them can get a different signature, so
+        # only those are checked again; a long chain of states then takes linear time instead of one round of
+        # the whole nfa per state.
+        edges: dict[STATE, list[tuple[str, STATE]]] = {state: [] for state in self.K}
+        sources: dict[STATE, set[STATE]] = {state: set() for state in self.K}
+        for (state, symbol), next_states in self.d.items():
+            for next_state in next_states:
+                if forward:
+                    edges[state].append((symbol, next_state))
+                    sources[next_state].add(state)
+                else:
+                    edges[next_state].append((symbol, state))
+                    sources[state].add(next_state)
+
+        def initial_block(state: STATE) -> Hashable:
+            if state in self.F:
+                return True, labels.get(state)
+            return (False, state == self.q0) if not forward else (False,)
+
+        def signature(state: STATE) -> frozenset[tuple[str, int]]:
+            return frozenset((symbol, block[other]) for symbol, other in edges[state])
+
+        block_ids: dict[Hashable, int] = {}
+        block = {state: block_ids.setdefault(initial_block(state), len(block_ids)) for state in self.K}
+        members: dict[int, set[STATE]] = {}
+        for state, block_id in block.items():
+            members.setdefault(block_id, set()).add(state)
+        dirty = set(self.K)
+        while dirty:
+            by_block: dict[int, list[STATE]] = {}
+            for state in dirty:
+                by_block.setdefault(block[state], []).append(state)
+            # the signatures are all taken on the partition of the previous round, then the blocks are split
+            splits = []
+            for block_id, states in by_block.items():
+                # the states of the block that are not checked again keep the signature and the id of the block,
+                # otherwise the largest group keeps them, so that few states move
+                groups: dict[frozenset[tuple[str, int]], list[STATE]] = {}
+                kept_signature = None
+                if len(states) < len(members[block_id]):
+                    kept_signature = signature(next(state for state in members[block_id] if state not in dirty))
+                for state in states:
+                    groups.setdefault(signature(state), []).append(state)
+                if kept_signature is None:
+                    kept_signature = max(groups, key=lambda key: len(groups[key]))
+                splits.append((block_id, [group for key, group in groups.items() if key != kept_signature]))
+            moved = []
+            for block_id, groups in splits:
+                for group in groups:
+                    new_id = len(members)
+                    members[new_id] = set(group)
+                    members[block_id].difference_update(group)
+                    for state in group:
+                        block[state] = new_id
+                    moved.extend(group)
+            dirty = {source for state in moved for source in sources[state]}
+
+        names: dict[int, STATE] = {}
+        for state in sorted(self.K):
+            names.setdefault(block[state], state)
+        names[block[self.q0]] = self.q0
+        name = lambda state: names[block[state]]
+        transitions: dict[tuple[STATE, str], set[STATE]] = {}
+        for (state, symbol), next_states in self.d.items():
+            transitions.setdefault((name(state), symbol), set()).update(map(name, next_states))
+        return NFA(S=set(self.S), K=set(names.values()), q0=self.q0, d=transitions, F={name(state) for state in self.F})
+
     def remap_states[OTHER_STATE](self, f: 'Callable[[STATE], OTHER_STATE]') -> None:
         self.K = {f(state) for state in self.K}
         self.q0 = f(self.q0)
@@ -72,4 +265,75 @@ class NFA[STATE]:
                 f"  Transitions: {{{transitions_str}}},\n"
                 f"  Initial State: {self.q0},\n"
                 f"  Accepting States: {{{accepting_states_str}}}\n"
-                f")")
\ No newline at end of file
+                f")")
+
+
+class _SubsetStore:
+    # On-disk set of subsets, each stored as the bytes of its sorted state ids: an append-only data file,
+    # a file of (offset, length) per subset id, and a hash index of (hash, id + 1) slots with linear probing
+    # over a memory-mapped file that doubles when it gets half full.
+    SLOT = struct.Struct('<QQ')
+    ENTRY = struct.Struct('<QQ')
+
+    def __init__(self, directory: str) -> None:
+        self.directory = directory
+        self.data = os.open(os.path.join(directory, 'subsets'), os.O_RDWR | os.O_CREAT)
+        self.entries = os.open(os.path.join(directory, 'entries'), os.O_RDWR | os.O_CREAT)
+        self.size = 0
+        self.count = 0
+        self.capacity = 0
+        self.index_file = None
+        self.index = None
+        self._resize(1 << 10)
+
+    def _resize(self, capacity: int) -> None:
+        old_index, old_file, old_capacity = self.index, self.index_file, self.capacity
+        self.capacity = capacity
+        self.index_file = open(os.path.join(self.directory, f'index-{capacity}'), 'w+b')
+        self.index_file.truncate(capacity * self.SLOT.size)
+        self.index = mmap.mmap(self.index_file.fileno(), capacity * self.SLOT.size)
+        if old_index is not None:
+            for slot in range(old_capacity):
+                subset_hash, subset_id = self.SLOT.unpack_from(old_index, slot * self.SLOT.size)
+                if subset_id:
+                    self.SLOT.pack_into(self.index, self._free_slot(subset_hash) * self.SLOT.size, subset_hash, subset_id)
+            old_index.close()
+            old_file.close()
+            os.remove(old_file.name)
+
+    def _free_slot(self, subset_hash: int) -> int:
+        slot = subset_hash & (self.capacity - 1)
+        while self.SLOT.unpack_from(self.index, slot * self.SLOT.size)[1]:
+            slot = (slot + 1) & (self.capacity - 1)
+        return slot
+
+    def get(self, subset_id: int) -> bytes:
+        offset, length = self.ENTRY.unpack(os.pread(self.entries, self.ENTRY.size, subset_id * self.ENTRY.size))
+        return os.pread(self.data, length, offset)
+
+    def add(self, subset: bytes) -> tuple[int, bool]:
+        # the id of the subset and whether it was new
+        subset_hash = int.from_bytes(hashlib.blake2b(subset, digest_size=8).digest(), 'little')
+        slot = subset_hash & (self.capacity - 1)
+        while True:
+            slot_hash, slot_id = self.SLOT.unpack_from(self.index, slot * self.SLOT.size)
+            if not slot_id:
+                break
+            if slot_hash == subset_hash and self.get(slot_id - 1) == subset:
+                return slot_id - 1, False
+            slot = (slot + 1) & (self.capacity - 1)
+        subset_id = self.count
+        os.pwrite(self.data, subset, self.size)
+        os.pwrite(self.entries, self.ENTRY.pack(self.size, len(subset)), subset_id * self.ENTRY.size)
+        self.SLOT.pack_into(self.index, slot * self.SLOT.size, subset_hash, subset_id + 1)
+        self.size += len(subset)
+        self.count += 1
+        if 2 * self.count > self.capacity:
+            self._resize(2 * self.capacity)
+        return subset_id, True
+
+    def close(self) -> None:
+        self.index.close()
+        self.index_file.close()
+        os.close(self.data)
+        os.close(self.entries)
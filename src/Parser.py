@@ -1,6 +1,8 @@
 from dataclasses import dataclass
 from typing import List, Tuple, Union, Dict
 
+from src.TokenStream import TokenStream
+
 
 @dataclass
 class Atom:
@@ -75,24 +77,30 @@ class Concat(Atom):
 
 
 class Parser:
-    def __init__(self, tokens: List[Tuple[str, str]]):
+    def __init__(self, tokens: Union[List[Tuple[str, str]], TokenStream]):
         self.tokens = self.remove_white_spaces(tokens)
         self.current_index = 0
 
-    def remove_white_spaces(self, tokens: List[Tuple[str, str]]) -> List[Tuple[str, str]]:
+    def remove_white_spaces(self, tokens: Union[List[Tuple[str, str]], TokenStream]) \
+            -> Union[List[Tuple[str, str]], TokenStream]:
+        if isinstance(tokens, TokenStream):
+            # nothing to do if the lexer already skipped the white spaces
+            if tokens.skipped >= {'WHITE_SPACE', 'NEW_LINE', 'TAB'}:
+                return tokens
+            return tokens.without({'WHITE_SPACE', 'NEW_LINE', 'TAB'})
         return [(x, y) for (x, y) in tokens if x not in {'WHITE_SPACE', 'NEW_LINE', 'TAB'}]
 
     def parse(self) -> Atom:
         return self.parse_atom()
 
     def parse_atom(self) -> Atom:
-        token_type, token_value = self.tokens[self.current_index]
+        token_type = self.token_type(self.current_index)
         if self.match('OPEN_PARENTHESIS'):
             return self.parse_list()
         elif self.match('LITERAL'):
-            return Literal(token_value)
+            return Literal(self.token_value(self.current_index - 1))
         elif self.match('LITERAL_NUMBER'):
-            return Literal(token_value)
+            return Literal(self.token_value(self.current_index - 1))
         elif self.match('LAMBDA'):
             return self.parse_lambda()
         elif self.match('SUM'):
@@ -112,27 +120,37 @@ class Parser:
         return ExList(children)
 
     def parse_lambda(self) -> LambdaEx:
-        _, token_value = self.tokens[self.current_index]
+        variable = self.token_value(self.current_index)
         self.current_index += 1
-        variable = token_value
         self.current_index += 1  # skip the ':' token
         body = self.parse_atom()
         return LambdaEx(variable, body)
 
+    def token_type(self, index: int) -> str:
+        # a TokenStream gives the type of a token without cutting its text from the source
+        if isinstance(self.tokens, TokenStream):
+            return self.tokens.kind(index)
+        return self.tokens[index][0]
+
+    def token_value(self, index: int) -> str:
+        if isinstance(self.tokens, TokenStream):
+            return self.tokens.text(index)
+        return self.tokens[index][1]
+
     def expect(self, token: str) -> None:
-        token_type, _ = self.tokens[self.current_index]
+        token_type = self.token_type(self.current_index)
         if not self.match(token):
             raise ValueError(f"Expected token {token}, but got {token_type}")
 
     def match(self, token: str) -> bool:
-        token_type, _ = self.tokens[self.current_index]
+        token_type = self.token_type(self.current_index)
         if self.current_index < len(self.tokens) and token_type == token:
             self.current_index += 1
             return True
         return False
 
     def peek(self, token: str) -> bool:
-        token_type, _ = self.tokens[self.current_index]
+        token_type = self.token_type(self.current_index)
         if token_type == token:
             return True
         return False
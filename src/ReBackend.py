@@ -0,0 +1,188 @@
+import re
+from operator import itemgetter
+
+from .DFA import DFA
+from .Regex import Regex, Character, Concat, Epsilon, Group, Plus, QuestionMark, Star, Union, parse_regex
+
+
+def _char_class(regex: Regex) -> set[str] | None:
+    # the characters of a union of single characters (a range or a plain alternation), None for anything else
+    chars, stack = set(), [regex]
+    while stack:
+        regex = stack.pop()
+        if isinstance(regex, Union):
+            stack.extend((regex.left, regex.right))
+        elif isinstance(regex, Group):
+            stack.append(regex.sub)
+        elif isinstance(regex, Character):
+            chars.add(regex.char)
+        else:
+            return None
+    return chars
+
+
+def _items(regex: Regex) -> list[tuple[str, set[str], str]] | None:
+    # Flatten a regex into a sequence of items (quantifier, first characters, python source):
+    # every atom is a class of single characters or a literal string, optionally quantified. None if the
+    # regex has any other shape (an alternation of longer strings, a quantified concatenation of classes...)
+    items, stack = [], [regex]
+    while stack:
+        regex = stack.pop()
+        if isinstance(regex, Concat):
+            stack.extend((regex.right, regex.left))
+            continue
+        if isinstance(regex, Group):
+            stack.append(regex.sub)
+            continue
+        if isinstance(regex, Epsilon):
+            continue
+        quantifier = {Star: '*', Plus: '+', QuestionMark: '?'}.get(type(regex), '')
+        atom = regex.sub if quantifier else regex
+        while isinstance(atom, Group):
+            atom = atom.sub
+        chars = _char_class(atom)
+        if chars is not None:
+            source = re.escape(next(iter(chars))) if len(chars) == 1 else \
+                '[' + ''.join(re.escape(char) for char in sorted(chars)) + ']'
+            items.append((quantifier, chars, source))
+            continue
+        literal = _literal_string(atom)
+        if literal is None or (not quantifier and literal == ''):
+            return None
+        if literal:
+            items.append((quantifier, {literal[0]}, f'(?:{re.escape(literal)})' if quantifier else re.escape(literal)))
+    return items
+
+
+def _literal_string(regex: Regex) -> str | None:
+    chars, stack = [], [regex]
+    while stack:
+        regex = stack.pop()
+        if isinstance(regex, Concat):
+            stack.extend((regex.right, regex.left))
+        elif isinstance(regex, Group):
+            stack.append(regex.sub)
+        elif isinstance(regex, Character):
+            chars.append(regex.char)
+        elif not isinstance(regex, Epsilon):
+            return None
+    return ''.join(chars)
+
+
+def _first(items: list[tuple[str, set[str], str]]) -> set[str]:
+    # the characters a non-empty match can start with
+    first: set[str] = set()
+    for quantifier, chars, _ in items:
+        first |= chars
+        if quantifier not in ('*', '?'):
+            break
+    return first
+
+
+def translate(regex: Regex) -> tuple[str, set[str]] | None:
+    # Python source for a regex whose greedy match is always its longest match and the characters its
+    # matches start with, None if that cannot be shown. A sequence of classes and literals qualifies if every
+    # quantified item starts with characters that cannot start what may follow it: then no quantifier ever
+    # has to give characters back, the match is forced character by character, and re takes it as far as it goes.
+    items = _items(regex)
+    if items is None:
+        return None
+    follow: set[str] = set()
+    for quantifier, first, _ in reversed(items):
+        if quantifier and not first.isdisjoint(follow):
+            return None
+        follow = first | follow if quantifier in ('*', '?') else set(first)
+    return ''.join(source + quantifier for quantifier, _, source in items), _first(items)
+
+
+def translate_rule(lexeme: str, regex: str) -> tuple[str, set[str]]:
+    # translate a rule of a spec, a rule that cannot be translated safely is an error
+    translation = translate(parse_regex(regex))
+    if translation is None:
+        raise ValueError(f'The rule {lexeme} ({regex!r}) cannot be translated to a python regex safely')
+    return translation
+
+
+def _precedes(first: DFA, later: DFA, chars: list[str], later_wins_ties: bool) -> bool:
+    # Whether an alternation trying first before later always gives the token of the dfa, on an input that
+    # starts with one of chars. It does not if some word of later is longer than the longest prefix first
+    # matches in it (maybe the empty one), or as long and later has the priority: both automata are run side
+    # by side to look for one.
+    symbols = sorted(first.S | later.S)
+    queue, seen, nullable = [], set(), first.q0 in first.F
+    for char in chars:
+        queue.append((first.d.get((first.q0, char)), later.d.get((later.q0, char)), nullable))
+    for state, later_state, matched in queue:
+        if later_state is None or (state, later_state, matched) in seen:
+            continue
+        seen.add((state, later_state, matched))
+        accepted = state in first.F
+        if later_state in later.F and (accepted and later_wins_ties or not accepted and matched):
+            return False
+        matched = matched or accepted
+        queue.extend((first.d.get((state, symbol)), later.d.get((later_state, symbol)), matched)
+                     for symbol in symbols)
+    return True
+
+
+class ReBackend:
+    # A spec compiled to one python pattern, an alternation with one branch per set of rules that can start
+    # a token with the same characters; a branch is guarded by those characters, so at most one applies.
+    # The rules of a branch are tried in an order that is shown to give the longest match, the first rule
+    # winning ties, which are the semantics of the dfa. If there is no such order every rule is an optional
+    # lookahead with its own group and the branch consumes nothing: the group that reaches farthest is the
+    # token. Group names are rule{index}_{branch}.
+    def __init__(self, spec: list[tuple[str, str]]) -> None:
+        rules = [translate_rule(lexeme, regex) for lexeme, regex in spec]
+        automata = [parse_regex(regex).thompson().subset_construction() for _, regex in spec]
+
+        branches: dict[tuple[int, ...], list[str]] = {}
+        for char in sorted(set().union(*(first for _, first in rules))):
+            indices = tuple(index for index, (_, first) in enumerate(rules) if char in first)
+            branches.setdefault(indices, []).append(char)
+        alternatives = []
+        for branch, (indices, chars) in enumerate(branches.items()):
+            guard = '(?=[' + ''.join(map(re.escape, chars)) + '])'
+            order, remaining = [], list(indices)
+            while remaining:
+                index = next((index for index in remaining
+                              if all(_precedes(automata[index], automata[other], chars, other < index)
+                                     for other in remaining if other != index)), None)
+                if index is None:
+                    break
+                order.append(index)
+                remaining.remove(index)
+            if not remaining:
+                alternatives.append(guard + '(?:' + '|'.join(f'(?P<rule{index}_{branch}>{rules[index][0]})'
+                                                             for index in order) + ')')
+            else:
+                alternatives.append(guard + ''.join(f'(?:(?=(?P<rule{index}_{branch}>{rules[index][0]})))?'
+                                                    for index in indices))
+        self.pattern = re.compile('|'.join(alternatives))
+        # the lexeme of every group, by group number
+        self.groups = [''] * (self.pattern.groups + 1)
+        for name, number in self.pattern.groupindex.items():
+            self.groups[number] = spec[int(name[4:name.index('_')])][0]
+
+    def lex(self, word: str, skip: frozenset[str] = frozenset()) -> list[tuple[str, str]] | None:
+        # the tokens of the word, None on a lexical error (the lexer reports it with the dfa)
+        match, groups, ends = self.pattern.match, self.groups, itemgetter(1)
+        lexer_output, start = [], 0
+        while start < len(word):
+            token = match(word, start)
+            if token is None:
+                return None
+            end = token.end()
+            if end > start:
+                lexeme = groups[token.lastindex]
+            else:
+                # the lookaheads of a branch, the groups of the other branches did not take part (end -1)
+                reached = list(map(ends, token.regs))
+                end = max(reached)
+                if end <= start:
+                    return None
+                lexeme = groups[reached.index(end)]
+            if lexeme not in skip:
+                lexer_output.append((lexeme, word[start:end]))
+            start = end
+        return lexer_output
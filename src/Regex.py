@@ -1,4 +1,5 @@
 from .NFA import NFA, EPSILON
+from .TDFA import TaggedNFA, TDFA
 from dataclasses import dataclass
 
 
@@ -8,20 +9,30 @@ class Regex:
     def thompson(self) -> NFA[int]:
         raise NotImplementedError("The thompson method of the Regex class should never be called")
 
+    def tagged(self, nfa: TaggedNFA, start: int) -> int:
+        # abstract method: add the fragment of the regex to a tagged nfa from start and return its end state
+        raise NotImplementedError("The tagged method of the Regex class should never be called")
+
+    def tdfa(self) -> TDFA:
+        # the tagged dfa of the regex, it reports the spans of the named groups of a match
+        nfa = TaggedNFA()
+        start = nfa.add_state()
+        return TDFA.from_nfa(nfa, start, self.tagged(nfa, start))
+
 
 def parse_regex(regex: str) -> Regex:
     # create a Regex object by parsing the string
     def prepare(regex: str) -> str:
         escape_next = False
-        new = ''
+        new = []
         for char in regex:
             if char == '\\':
                 escape_next = True
-                new += char
+                new.append(char)
             elif char != ' ' or escape_next:
-                new += char
+                new.append(char)
                 escape_next = False
-        return new
+        return ''.join(new)
     return RegexParser(prepare(regex)).parse()
 
 
@@ -40,6 +51,9 @@ class Epsilon(Regex):
                    d={},
                    F={0})
 
+    def tagged(self, nfa: TaggedNFA, start: int) -> int:
+        return start
+
 
 @dataclass
 class Character(Regex):
@@ -56,6 +70,11 @@ class Character(Regex):
                    d={(0, self.char): {1}},
                    F={1})
 
+    def tagged(self, nfa: TaggedNFA, start: int) -> int:
+        end = nfa.add_state()
+        nfa.add_edge(start, self.char, end)
+        return end
+
 
 @dataclass
 class Concat(Regex):
@@ -65,25 +84,37 @@ class Concat(Regex):
         self.level = 2
 
     def __repr__(self):
-        def format_side(side):
-            if side.level > self.level:
-                return f'({side})'
+        return ''.join(f'({factor})' if factor.level > self.level else f'{factor}' for factor in self.factors())
+
+    def factors(self) -> list[Regex]:
+        # flatten nested concatenations (the parser builds them left-deep) without recursing
+        factors, stack = [], [self]
+        while stack:
+            regex = stack.pop()
+            if isinstance(regex, Concat):
+                stack.extend((regex.right, regex.left))
             else:
-                return f'{side}'
-
-        return format_side(self.left) + format_side(self.right)
+                factors.append(regex)
+        return factors
 
     def thompson(self) -> NFA[int]:
-        left_nfa = self.left.thompson()
-        right_nfa = self.right.thompson()
-        right_nfa.remap_states(lambda x: x + len(left_nfa.K))
-        update_d = {**left_nfa.d, **right_nfa.d}
-        update_d.update({(state, EPSILON): {right_nfa.q0} for state in left_nfa.F})
-        return NFA(S=left_nfa.S.union(right_nfa.S),
-                   K=left_nfa.K.union(right_nfa.K),
-                   q0=left_nfa.q0,
-                   d=update_d,
-                   F=right_nfa.F)
+        factors = iter(self.factors())
+        nfa = next(factors).thompson()
+        for factor in factors:
+            sub_nfa = factor.thompson()
+            offset = len(nfa.K)
+            sub_nfa.remap_states(lambda x: x + offset)
+            nfa.S.update(sub_nfa.S)
+            nfa.K.update(sub_nfa.K)
+            nfa.d.update(sub_nfa.d)
+            nfa.d.update({(state, EPSILON): {sub_nfa.q0} for state in nfa.F})
+            nfa.F = sub_nfa.F
+        return nfa
+
+    def tagged(self, nfa: TaggedNFA, start: int) -> int:
+        for factor in self.factors():
+            start = factor.tagged(nfa, start)
+        return start
 
 
 @dataclass
@@ -96,18 +127,100 @@ class Union(Regex):
     def __repr__(self):
         return f'({self.left})' + '|' + f'({self.right})'
 
+    def alternatives(self) -> list[Regex]:
+        # flatten nested unions (the parser builds them left-deep) without recursing
+        alternatives, stack = [], [self]
+        while stack:
+            regex = stack.pop()
+            if isinstance(regex, Union):
+                stack.extend((regex.right, regex.left))
+            else:
+                alternatives.append(regex)
+        return alternatives
+
     def thompson(self) -> NFA[int]:
-        left_nfa = self.left.thompson()
-        right_nfa = self.right.thompson()
-        left_nfa.remap_states(lambda x: x + 1)
-        right_nfa.remap_states(lambda x: x + len(left_nfa.K) + 1)
-        update_d = {**left_nfa.d, **right_nfa.d}
-        update_d.update({(0, EPSILON): {left_nfa.q0, right_nfa.q0}})
-        return NFA(S=left_nfa.S.union(right_nfa.S),
-                   K=left_nfa.K.union(right_nfa.K).union({0}),
-                   q0=0,
-                   d=update_d,
-                   F=left_nfa.F.union(right_nfa.F))
+        alternatives = self.alternatives()
+        words = [_literal(alternative) for alternative in alternatives]
+        if all(word is not None for word in words):
+            return _keyword_automaton(words)
+        sub_nfas = [alternative.thompson() for alternative in alternatives]
+        S, K, d, F = set(), {0}, {(0, EPSILON): set()}, set()
+        for sub_nfa in sub_nfas:
+            offset = len(K)
+            sub_nfa.remap_states(lambda x: x + offset)
+            S.update(sub_nfa.S)
+            K.update(sub_nfa.K)
+            d.update(sub_nfa.d)
+            d[(0, EPSILON)].add(sub_nfa.q0)
+            F.update(sub_nfa.F)
+        return NFA(S=S, K=K, q0=0, d=d, F=F)
+
+    def tagged(self, nfa: TaggedNFA, start: int) -> int:
+        end = nfa.add_state()
+        for alternative in self.alternatives():
+            alternative_start = nfa.add_state()
+            nfa.add_edge(start, EPSILON, alternative_start)
+            nfa.add_edge(alternative.tagged(nfa, alternative_start), EPSILON, end)
+        return end
+
+
+def _literal(regex: Regex) -> str | None:
+    # the string matched by a regex built only from characters and concatenations, None for anything else
+    chars, stack = [], [regex]
+    while stack:
+        regex = stack.pop()
+        if isinstance(regex, Concat):
+            stack.extend((regex.right, regex.left))
+        elif isinstance(regex, Character):
+            chars.append(regex.char)
+        elif isinstance(regex, Group):
+            stack.append(regex.sub)
+        elif not isinstance(regex, Epsilon):
+            return None
+    return ''.join(chars)
+
+
+def _keyword_automaton(words: list[str]) -> NFA[int]:
+    # Compile an alternation of literal strings into a minimal acyclic dfa (as an epsilon-free nfa):
+    # build the prefix trie, then merge the nodes with equal suffix languages bottom-up, in linear time
+    children: list[dict[str, int]] = [{}]
+    final = [False]
+    for word in words:
+        node = 0
+        for char in word:
+            if char not in children[node]:
+                children[node][char] = len(children)
+                children.append({})
+                final.append(False)
+            node = children[node][char]
+        final[node] = True
+
+    # trie nodes are created before their children, so walking them backwards visits children first
+    register: dict[tuple, int] = {}
+    merged = [0] * len(children)
+    for node in range(len(children) - 1, -1, -1):
+        signature = (final[node], tuple(sorted((char, merged[child]) for char, child in children[node].items())))
+        merged[node] = register.setdefault(signature, node)
+
+    numbering = {merged[0]: 0}
+    transitions: dict[tuple[int, str], set[int]] = {}
+    final_states = set()
+    stack = [merged[0]]
+    while stack:
+        node = stack.pop()
+        if final[node]:
+            final_states.add(numbering[node])
+        for char, child in children[node].items():
+            child = merged[child]
+            if child not in numbering:
+                numbering[child] = len(numbering)
+                stack.append(child)
+            transitions[(numbering[node], char)] = {numbering[child]}
+    return NFA(S={char for _, char in transitions},
+               K=set(numbering.values()),
+               q0=0,
+               d=transitions,
+               F=final_states)
 
 
 @dataclass
@@ -134,6 +247,16 @@ class Star(Regex):
                    d=sub_nfa.d,
                    F={maximum})
 
+    def tagged(self, nfa: TaggedNFA, start: int) -> int:
+        # the loop edge comes before the exit, so the star is greedy
+        loop, body = nfa.add_state(), nfa.add_state()
+        nfa.add_edge(start, EPSILON, loop)
+        nfa.add_edge(loop, EPSILON, body)
+        nfa.add_edge(self.sub.tagged(nfa, body), EPSILON, loop)
+        end = nfa.add_state()
+        nfa.add_edge(loop, EPSILON, end)
+        return end
+
 
 @dataclass
 class QuestionMark(Regex):
@@ -150,6 +273,13 @@ class QuestionMark(Regex):
     def thompson(self) -> NFA[int]:
         return Union(self.sub, Epsilon()).thompson()
 
+    def tagged(self, nfa: TaggedNFA, start: int) -> int:
+        body, end = nfa.add_state(), nfa.add_state()
+        nfa.add_edge(start, EPSILON, body)
+        nfa.add_edge(self.sub.tagged(nfa, body), EPSILON, end)
+        nfa.add_edge(start, EPSILON, end)
+        return end
+
 
 @dataclass
 class Plus(Regex):
@@ -166,24 +296,84 @@ class Plus(Regex):
     def thompson(self) -> NFA[int]:
         return Concat(self.sub, Star(self.sub)).thompson()
 
+    def tagged(self, nfa: TaggedNFA, start: int) -> int:
+        return Star(self.sub).tagged(nfa, self.sub.tagged(nfa, start))
+
+
+@dataclass
+class Group(Regex):
+    # named capture group (?P<name>...), it matches like its parenthesized subexpression
+    def __init__(self, sub, name):
+        self.sub = sub
+        self.name = name
+        self.level = 0
+
+    def __repr__(self):
+        return f'(?P<{self.name}>{self.sub})'
+
+    def thompson(self) -> NFA[int]:
+        return self.sub.thompson()
+
+    def tagged(self, nfa: TaggedNFA, start: int) -> int:
+        open_tag, close_tag = nfa.group_tags(self.name)
+        body, end = nfa.add_state(), nfa.add_state()
+        nfa.add_edge(start, open_tag, body)
+        nfa.add_edge(self.sub.tagged(nfa, body), close_tag, end)
+        return end
+
 
 @dataclass
 class RegexParser:
+    # expression := term ('|' term)*
+    # term       := factor+          (a term ends before ')' or '|')
+    # factor     := atom ('*' | '?' | '+')?
+    # atom       := '(' ('?P<' name '>')? expression ')' | '[' char '-' char ']' | char
+    # The parser is iterative: the alternatives and the term parsed so far of every open group are kept
+    # on an explicit stack, so huge generated patterns are parsed in linear time without recursion.
     def __init__(self, pattern):
         self.pattern = pattern
         self.current_index = 0
+        self.group_names: set[str] = set()
 
     def parse(self) -> Regex:
-        return self.parse_expression()
-
-    def parse_expression(self) -> Regex:
-        expression = self.parse_term()
-        while self.match('|'):
-            expression = Union(expression, self.parse_term())
-        return expression
+        groups: list[tuple[Regex | None, Regex | None, str | None]] = []
+        expression, term = None, None
+        while True:
+            if self.match('('):
+                groups.append((expression, term, self.parse_group_name()))
+                expression, term = None, None
+                continue
+            term = self.parse_factor(term, self.parse_atom())
+            while self.current_index == len(self.pattern) or self.pattern[self.current_index] in (')', '|'):
+                expression = term if expression is None else Union(expression, term)
+                term = None
+                if self.match('|'):
+                    break
+                if not groups:
+                    return expression
+                self.expect(')')
+                group = expression
+                expression, term, name = groups.pop()
+                if name is not None:
+                    group = Group(group, name)
+                term = self.parse_factor(term, group)
+
+    def parse_group_name(self) -> str | None:
+        # the name of a capture group, right after its '('; a plain group has none
+        if not self.pattern.startswith('?P<', self.current_index):
+            return None
+        end = self.pattern.find('>', self.current_index)
+        if end < 0:
+            raise ValueError(f'Unterminated group name at {self.current_index}')
+        name = self.pattern[self.current_index + 3:end]
+        if not name.isidentifier() or name in self.group_names:
+            raise ValueError(f'Bad group name {name}')
+        self.group_names.add(name)
+        self.current_index = end + 1
+        return name
 
     def parse_syntactic_sugar(self) -> Regex:
-        expression = self.parse_atom()
+        expression = Character(self.consume())
         start = expression.char
         self.expect('-')
         end = self.consume()
@@ -191,36 +381,26 @@ class RegexParser:
             expression = Union(expression, Character(chr(ascii_code)))
         return expression
 
-    def parse_term(self) -> Regex:
-        term = self.parse_factor()
-        while self.current_index < len(self.pattern) and self.pattern[self.current_index] not in (')', '|'):
-            term = Concat(term, self.parse_factor())
-        return term
-
-    def parse_factor(self) -> Regex:
-        factor = self.parse_atom()
+    def parse_factor(self, term: Regex | None, atom: Regex) -> Regex:
+        # apply the optional quantifier to the atom and append it to the term
+        factor = atom
         if self.match('*'):
             factor = Star(factor)
         elif self.match('?'):
             factor = QuestionMark(factor)
         elif self.match('+'):
             factor = Plus(factor)
-        return factor
+        return factor if term is None else Concat(term, factor)
 
     def parse_atom(self) -> Regex:
-        if self.match('('):
-            subexpression = self.parse_expression()
-            self.expect(')')
-            return subexpression
-        elif self.match('['):
+        # groups are opened by parse, this only reads character ranges and single characters
+        if self.match('['):
             subexpression = self.parse_syntactic_sugar()
             self.expect(']')
             return subexpression
-        else:
-            if self.pattern == EPSILON:
-                return Epsilon()
-            atom = Character(self.consume())
-            return atom
+        if self.pattern == EPSILON:
+            return Epsilon()
+        return Character(self.consume())
 
     def match(self, char: str) -> bool:
         if self.current_index < len(self.pattern) and self.pattern[self.current_index] == char:
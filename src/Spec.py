@@ -12,3 +12,6 @@ SPEC = [
     ('CLOSED_PARENTHESIS', r'\)'),
     ('FUNCTION_DEFINITION', r':')
 ]
+
+# the lexemes the parser never needs, the lexer drops them while scanning
+SKIP = {'WHITE_SPACE', 'TAB', 'NEW_LINE'}
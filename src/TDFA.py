@@ -0,0 +1,108 @@
+from dataclasses import dataclass, field
+
+from .NFA import EPSILON
+
+# an operation of a tdfa transition, one per configuration of the target state:
+# the configuration it comes from in the source state and the tags it sets to the current position
+Operations = tuple[tuple[int, tuple[int, ...]], ...]
+
+
+class TaggedNFA:
+    # Thompson nfa with ordered edges for submatch extraction. An edge label is a symbol, EPSILON, or a tag id
+    # (an epsilon edge that records the current position). The edges of a state are listed by priority,
+    # so the first path wins: alternatives from left to right, and quantifiers are greedy.
+    def __init__(self) -> None:
+        self.edges: list[list[tuple[str | int, int]]] = []
+        self.groups: list[str] = []
+
+    def add_state(self) -> int:
+        self.edges.append([])
+        return len(self.edges) - 1
+
+    def add_edge(self, source: int, label: str | int, target: int) -> None:
+        self.edges[source].append((label, target))
+
+    def group_tags(self, name: str) -> tuple[int, int]:
+        # the tags recording the start and the end of a group
+        if name not in self.groups:
+            self.groups.append(name)
+        index = self.groups.index(name)
+        return 2 * index, 2 * index + 1
+
+
+@dataclass
+class TDFA:
+    # Tagged dfa: a state is the ordered list of the nfa states reached (its configurations), and every
+    # configuration has its own registers holding the tags. A transition maps to the next state and the
+    # operations that build the registers of its configurations, so submatches come out of a single scan
+    # with no backtracking. finals maps a final state to the configuration of the highest priority path.
+    groups: list[str]
+    initial: Operations
+    d: dict[tuple[int, str], tuple[int, Operations]] = field(default_factory=dict)
+    finals: dict[int, int] = field(default_factory=dict)
+
+    @staticmethod
+    def from_nfa(nfa: TaggedNFA, start: int, final: int) -> 'TDFA':
+        def closure(sources: list[tuple[int, int]]) -> tuple[tuple[int, ...], Operations]:
+            # depth first in priority order, the first path to reach a state wins; only the states that read
+            # a symbol and the final state are kept as configurations
+            kernel, operations, seen = [], [], set()
+            for source, configuration in sources:
+                stack = [(source, ())]
+                while stack:
+                    state, tags = stack.pop()
+                    if state in seen:
+                        continue
+                    seen.add(state)
+                    if state == final or any(isinstance(label, str) and label for label, _ in nfa.edges[state]):
+                        kernel.append(state)
+                        operations.append((configuration, tags))
+                    for label, target in reversed(nfa.edges[state]):
+                        if isinstance(label, int):
+                            stack.append((target, tags + (label,)))
+                        elif label == EPSILON:
+                            stack.append((target, tags))
+            return tuple(kernel), tuple(operations)
+
+        initial, operations = closure([(start, 0)])
+        tdfa = TDFA(groups=list(nfa.groups), initial=operations)
+        states = {initial: 0}
+        queue = [initial]
+        for kernel in queue:
+            state_id = states[kernel]
+            if final in kernel:
+                tdfa.finals[state_id] = kernel.index(final)
+            symbols = {label: None for state in kernel for label, _ in nfa.edges[state] if isinstance(label, str) and label}
+            for symbol in symbols:
+                sources = [(target, configuration) for configuration, state in enumerate(kernel)
+                           for label, target in nfa.edges[state] if label == symbol]
+                next_kernel, operations = closure(sources)
+                if next_kernel not in states:
+                    states[next_kernel] = len(states)
+                    queue.append(next_kernel)
+                tdfa.d[(state_id, symbol)] = (states[next_kernel], operations)
+        return tdfa
+
+    def match(self, word: str, offset: int = 0) -> dict[str, tuple[int, int] | None] | None:
+        # the (start, end) span of every group if the whole word matches, positions are shifted by offset
+        def apply(registers: list[list[int]], operations: Operations, position: int) -> list[list[int]]:
+            next_registers = []
+            for configuration, tags in operations:
+                values = registers[configuration].copy()
+                for tag in tags:
+                    values[tag] = position
+                next_registers.append(values)
+            return next_registers
+
+        state, registers = 0, apply([[-1] * (2 * len(self.groups))], self.initial, offset)
+        for position, symbol in enumerate(word, offset + 1):
+            transition = self.d.get((state, symbol))
+            if transition is None:
+                return None
+            state, operations = transition
+            registers = apply(registers, operations, position)
+        if state not in self.finals:
+            return None
+        values = registers[self.finals[state]]
+        return {name: (values[2 * index], values[2 * index + 1]) if values[2 * index + 1] >= 0 else None
+                for index, name in enumerate(self.groups)}
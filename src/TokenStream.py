@@ -0,0 +1,94 @@
+import re
+from array import array
+from bisect import bisect_right
+from collections.abc import Sequence
+from dataclasses import dataclass
+from itertools import compress
+
+
+class LineIndex:
+    # The start offset of every line of a source, found in one pass; the line and the column of an offset are
+    # then found by bisection. Lines and columns count from 0, in characters for a str and in bytes otherwise.
+    def __init__(self, source: str | bytes | bytearray | memoryview) -> None:
+        newline = re.compile('\n' if isinstance(source, str) else b'\n')
+        self.starts = array('I', [0])
+        self.starts.extend(match.end() for match in newline.finditer(source))
+
+    def locate(self, offset: int) -> tuple[int, int]:
+        line = bisect_right(self.starts, offset) - 1
+        return line, offset - self.starts[line]
+
+
+@dataclass
+class LexError:
+    # a lexical error found by a recovering scan, the characters from start to end were skipped
+    start: int
+    end: int
+    line: int
+    column: int
+
+    def __str__(self) -> str:
+        return f'No viable alternative at character {self.column}, line {self.line}'
+
+
+class TokenStream(Sequence):
+    # Tokens stored by columns next to their source: the lexeme ids, start offsets and lengths are array('I'),
+    # so a token costs 12 bytes. Indexing gives the (lexeme, text) tuple of lex; the text of a token is only
+    # cut from the source when asked for, view gives it without a copy for a bytes source. Line and column
+    # are not tracked while lexing, location derives them from the offsets with a LineIndex built on first use.
+    # skipped holds the lexemes that were left out of the stream, errors the errors of a recovering scan.
+    def __init__(self, source: str | bytes | bytearray | memoryview, lexemes: list[str],
+                 skipped: frozenset[str] = frozenset()) -> None:
+        self.source = source
+        self.lexemes = lexemes
+        self.skipped = skipped
+        self.kinds = array('I')
+        self.starts = array('I')
+        self.lengths = array('I')
+        self.line_index: LineIndex | None = None
+        self.errors: list[LexError] = []
+
+    def __len__(self) -> int:
+        return len(self.kinds)
+
+    def __getitem__(self, index: int | slice) -> tuple[str, str] | list[tuple[str, str]]:
+        # a slice gives the list of its tokens, like the list of lex
+        if isinstance(index, slice):
+            return [self[position] for position in range(*index.indices(len(self)))]
+        return self.lexemes[self.kinds[index]], self.text(index)
+
+    def kind(self, index: int) -> str:
+        return self.lexemes[self.kinds[index]]
+
+    def start(self, index: int) -> int:
+        return self.starts[index]
+
+    def end(self, index: int) -> int:
+        return self.starts[index] + self.lengths[index]
+
+    def location(self, index: int) -> tuple[int, int]:
+        # the line and the column where the token starts
+        if self.line_index is None:
+            self.line_index = LineIndex(self.source)
+        return self.line_index.locate(self.starts[index])
+
+    def view(self, index: int) -> str | memoryview:
+        start = self.starts[index]
+        if isinstance(self.source, str):
+            return self.source[start:start + self.lengths[index]]
+        return memoryview(self.source)[start:start + self.lengths[index]]
+
+    def text(self, index: int) -> str:
+        text = self.view(index)
+        return text if isinstance(text, str) else bytes(text).decode('ascii')
+
+    def without(self, lexemes: set[str]) -> 'TokenStream':
+        # the stream without the tokens of the given lexemes, filtered column by column
+        keep = [lexeme not in lexemes for lexeme in self.lexemes]
+        selected = [keep[kind] for kind in self.kinds]
+        stream = TokenStream(self.source, self.lexemes, self.skipped | lexemes)
+        stream.line_index = self.line_index
+        stream.kinds = array('I', compress(self.kinds, selected))
+        stream.starts = array('I', compress(self.starts, selected))
+        stream.lengths = array('I', compress(self.lengths, selected))
+        return stream
@@ -1,14 +1,39 @@
-from sys import argv
+import mmap
+import os
+from sys import argv, stderr
 from src.Interpreter import Interpreter
 
 
 def main():
-    if len(argv) != 2:
+    # usage: main.py [--stats] [--mmap] <file>
+    # --stats dumps the lexer construction statistics as json on stderr
+    # --mmap lexes a memory mapping of the file instead of reading and decoding all of it
+    args = argv[1:]
+    stats = '--stats' in args
+    if stats:
+        args.remove('--stats')
+    use_mmap = '--mmap' in args
+    if use_mmap:
+        args.remove('--mmap')
+    if len(args) != 1:
         return
-    filename = argv[1]
-    with open (filename, 'r') as file:
-        input = file.read()
-    Interpreter(input).interpret()
+    filename = args[0]
+    if use_mmap:
+        # an empty file cannot be mapped
+        with open(filename, 'rb') as file:
+            input = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) if os.fstat(file.fileno()).st_size else b''
+        try:
+            interpreter = Interpreter(input, stats=stats)
+        finally:
+            if input:
+                input.close()
+    else:
+        with open (filename, 'r') as file:
+            input = file.read()
+        interpreter = Interpreter(input, stats=stats)
+    if stats:
+        print(interpreter.lexer.stats.to_json(), file=stderr)
+    interpreter.interpret()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,133 @@
+import itertools
+import os
+import random
+import tempfile
+import unittest
+from collections import Counter
+
+from src.Lexer import Lexer
+from src.NFA import EPSILON, SINK_STATE
+from src.Regex import parse_regex
+
+REGEXES = ['a', 'ab|c', '(a|b)*abb', '((a|c)*|(b|(d|e))*)*', 'a?b+c*', '(ec)*(a|b)+', '((e|(db))+|(e+e(e|f*)))+']
+
+
+def words(alphabet: set[str], max_length: int):
+    for length in range(max_length + 1):
+        for word in itertools.product(sorted(alphabet), repeat=length):
+            yield ''.join(word)
+
+
+class AutomataTests(unittest.TestCase):
+    def assertSameLanguage(self, expected, actual, alphabet: set[str], max_length: int = 6) -> None:
+        for word in words(alphabet, max_length):
+            self.assertEqual(actual.accept(word), expected.accept(word), f'different behaviour on "{word}"')
+
+    def test_remove_epsilons(self):
+        for regex in REGEXES:
+            nfa = parse_regex(regex).thompson()
+            epsilon_free = nfa.remove_epsilons()
+            self.assertFalse(any(symbol == EPSILON for _, symbol in epsilon_free.d))
+            self.assertTrue((epsilon_free.F - {epsilon_free.q0}).issubset(nfa.F))
+            self.assertLessEqual(len(epsilon_free.K), len(nfa.K))
+            self.assertSameLanguage(nfa.subset_construction(), epsilon_free.subset_construction(), nfa.S)
+
+    def test_remove_epsilons_empty_word(self):
+        nfa = parse_regex('a*').thompson().remove_epsilons()
+        self.assertIn(nfa.q0, nfa.F)
+        self.assertTrue(nfa.subset_construction().accept(''))
+
+    def test_reduce(self):
+        for regex in REGEXES:
+            nfa = parse_regex(regex).thompson()
+            reduced = nfa.reduce()
+            self.assertLessEqual(len(reduced.K), len(nfa.remove_epsilons().K))
+            self.assertSameLanguage(nfa.subset_construction(), reduced.subset_construction(), nfa.S)
+        self.assertEqual(len(parse_regex('[a-z]').thompson().reduce().K), 2)
+
+    def test_reduce_keeps_rule_priorities(self):
+        spec = [('IF', 'if'), ('IN', 'in'), ('ID', '[a-z]+'), ('SPACE', '\\ ')]
+        lexer = Lexer(spec)
+        reference = lexer.lex('if in int i iff')
+        labels = {state: index for index, states in enumerate(lexer.rule_states) for state in lexer.nfa.F if state in states}
+        reduced = lexer.nfa.reduce(labels)
+        self.assertLess(len(reduced.K), len(lexer.nfa.K))
+        lexer.dfa = reduced.subset_construction()
+        self.assertEqual(lexer.lex('if in int i iff'), reference)
+
+    def test_keyword_alternation(self):
+        keywords = ['if', 'in', 'int', 'for', 'fork', 'or']
+        nfa = parse_regex('|'.join(keywords)).thompson()
+        self.assertFalse(any(symbol == EPSILON for _, symbol in nfa.d))
+        self.assertTrue(all(len(next_states) == 1 for next_states in nfa.d.values()))
+        dfa = nfa.subset_construction()
+        for word in words(nfa.S, 4):
+            self.assertEqual(dfa.accept(word), word in keywords, f'different behaviour on "{word}"')
+        # a trie would need 13 states, the minimal automaton shares the ends of "if", "int", "or" and "fork"
+        self.assertEqual(len(nfa.K), 8)
+
+    def test_large_keyword_alternation(self):
+        keywords = [f'kw{number}x' for number in range(5000)]
+        dfa = parse_regex('|'.join(keywords)).thompson().subset_construction()
+        self.assertTrue(dfa.accept('kw4999x'))
+        self.assertFalse(dfa.accept('kw5000x'))
+
+    def test_subset_construction_progress(self):
+        calls = []
+        dfa = parse_regex('(a|b)*a(a|b)(a|b)').thompson().subset_construction(lambda found, pending: calls.append((found, pending)))
+        self.assertEqual(len(calls), len(dfa.K))
+        self.assertEqual(calls[-1], (len(dfa.K), 0))
+        self.assertEqual([found for found, _ in calls], sorted(found for found, _ in calls))
+
+    def test_matcher(self):
+        for regex in REGEXES:
+            dfa = parse_regex(regex).thompson().subset_construction()
+            for word in words(dfa.S, 5):
+                for size in (1, 2, 3):
+                    matcher = dfa.matcher()
+                    for start in range(0, len(word), size):
+                        matcher.feed(word[start:start + size])
+                    self.assertEqual(matcher.is_accepting, dfa.accept(word), f'different behaviour on "{word}"')
+
+    def test_matcher_dead_state(self):
+        matcher = parse_regex('(ab)*c').thompson().subset_construction().matcher()
+        self.assertTrue(matcher.feed(b'abab'))
+        self.assertFalse(matcher.is_accepting)
+        self.assertFalse(matcher.feed('abba' * 1000))
+        self.assertTrue(matcher.is_dead)
+        self.assertEqual(matcher.position, 6)
+        self.assertFalse(matcher.feed('c'))
+        matcher.reset()
+        self.assertTrue(matcher.feed(bytearray(b'abc')))
+        self.assertTrue(matcher.is_accepting)
+
+    def test_count(self):
+        for regex in REGEXES:
+            dfa = parse_regex(regex).thompson().subset_construction()
+            for n in range(5):
+                expected = sum(1 for word in words(dfa.S, n) if len(word) == n and dfa.accept(word))
+                self.assertEqual(dfa.count(n), expected, f'{regex} on length {n}')
+        dfa = parse_regex('(a|b)*').thompson().subset_construction()
+        self.assertEqual(dfa.count(200), 2 ** 200)
+
+    def test_sample(self):
+        dfa = parse_regex('(a|b)*a(a|b)(a|b)').thompson().subset_construction()
+        samples = dfa.sample(6, 4000, random.Random(0))
+        self.assertTrue(all(len(word) == 6 and dfa.accept(word) for word in samples))
+        # 32 words are accepted, each should come up about 125 times
+        counts = Counter(samples)
+        self.assertEqual(len(counts), dfa.count(6))
+        self.assertTrue(all(60 < count < 200 for count in counts.values()))
+        self.assertRaises(ValueError, parse_regex('aa').thompson().subset_construction().sample, 3, 1)
+
+    def test_subset_construction_on_disk(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'dfa.table')
+            for regex in REGEXES + ['(a|b)*a(a|b)(a|b)(a|b)(a|b)(a|b)(a|b)(a|b)(a|b)(a|b)(a|b)']:
+                nfa = parse_regex(regex).thompson()
+                table = nfa.subset_construction_on_disk(path, batch_size=7)
+                dfa = nfa.subset_construction()
+                self.assertEqual(len(table.accept), len(dfa.K | {SINK_STATE}), regex)
+                self.assertSameLanguage(dfa, table.to_dfa(), dfa.S)
+                table.close()
+            self.assertEqual(os.listdir(directory), ['dfa.table'])
@@ -0,0 +1,432 @@
+import io
+import json
+import mmap
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+from itertools import accumulate
+from pathlib import Path
+
+from src.DFATable import DFATable
+from src.Lexer import Lexer
+from src.Parser import Parser
+from src.TokenStream import LexError, LineIndex
+from src.Spec import SKIP, SPEC
+
+BONUS_TESTS = Path(__file__).resolve().parent.parent / 'bonus_tests'
+
+ERROR_SPEC = [
+    ("SPACE", "\\ "),
+    ("NEWLINE", "\n"),
+    ("ABC", "a(b+)c"),
+    ("AS", "a+"),
+    ("BCS", "(bc)+"),
+    ("DORC", "(d|c)+")
+]
+
+ERROR_INPUTS = [
+    "abcbcbcaabaad dccbca",
+    "d a\nbdbc ccddabbbc",
+    "e abbbcbcaadc c",
+    "abbc\naaabc dcccabcb",
+    "\naaa\nbabbcbcbc abbbcaabc",
+    "aaabc bcbc\nddc a",
+]
+
+
+def programs() -> list[str]:
+    return [path.read_text() for path in sorted(BONUS_TESTS.glob('*.l'))]
+
+
+def lex_shared(name: str, word: str) -> list[tuple[str, str]]:
+    table = DFATable.attach(name)
+    try:
+        return Lexer.from_table(table).lex(word)
+    finally:
+        table.close()
+
+
+def share_table() -> list[list[tuple[str, str]]]:
+    # lex the programs in a pool of workers attached to a published table, then unlink it
+    shared_memory = Lexer(SPEC).to_table().publish()
+    try:
+        with ProcessPoolExecutor(max_workers=2) as executor:
+            return list(executor.map(lex_shared, [shared_memory.name] * len(programs()), programs()))
+    finally:
+        shared_memory.close()
+        shared_memory.unlink()
+
+
+class LexerTests(unittest.TestCase):
+    def test_parallel_compilation(self):
+        for spec, words in ((SPEC, programs()), (ERROR_SPEC, ERROR_INPUTS)):
+            reference = Lexer(spec)
+            for workers in (1, 2):
+                lexer = Lexer(spec, workers=workers)
+                for word in words:
+                    self.assertEqual(lexer.lex(word), reference.lex(word))
+
+    def test_parallel_compilation_priority(self):
+        lexer = Lexer([('LAMBDA', 'lambda'), ('LITERAL', '[a-z]+')], workers=2)
+        self.assertEqual(lexer.lex('lambda'), [('LAMBDA', 'lambda')])
+        self.assertEqual(lexer.lex('lambdas'), [('LITERAL', 'lambdas')])
+
+    def test_add_rule(self):
+        partial_spec = [rule for rule in SPEC if rule[0] not in ('LAMBDA', 'CONCAT')]
+        for workers in (None, 1):
+            lexer = Lexer(partial_spec, workers=workers)
+            lexer.add_rule('LAMBDA', 'lambda', 1)
+            lexer.add_rule('CONCAT', '++', 8)
+            reference = Lexer(SPEC, workers=workers)
+            self.assertEqual(lexer.spec, SPEC)
+            # the new rule gets fresh states, so the dfas are compared through their tables numbered breadth-first
+            self.assertEqual(lexer.to_table(), reference.to_table())
+            for program in programs():
+                self.assertEqual(lexer.lex(program), reference.lex(program))
+
+    def test_remove_rule(self):
+        for workers in (None, 1):
+            lexer = Lexer(SPEC, workers=workers)
+            lexer.add_rule('KEYWORD', 'lambda|if', 0)
+            self.assertEqual(lexer.lex('if x'), [('KEYWORD', 'if'), ('WHITE_SPACE', ' '), ('LITERAL', 'x')])
+            lexer.remove_rule('KEYWORD')
+            lexer.remove_rule('LAMBDA')
+            reference = Lexer([rule for rule in SPEC if rule[0] != 'LAMBDA'], workers=workers)
+            self.assertEqual(len(lexer.dfa.K), len(reference.dfa.K))
+            self.assertEqual(lexer.dfa.S, reference.dfa.S)
+            for program in programs():
+                self.assertEqual(lexer.lex(program), reference.lex(program))
+            self.assertRaises(ValueError, lexer.remove_rule, 'LAMBDA')
+
+    def test_rule_updates_keep_table(self):
+        rng = random.Random(0)
+        regexes = ['a', 'ab', 'a*b', '(a|b)+', 'abc', 'b?c', 'c+', 'ca|ac', '(ab)*c', '[a-c]+', 'd']
+        for workers in (None, 1):
+            lexer = Lexer(SPEC, workers=workers)
+            table, rows = lexer.table, len(lexer.table.accept)
+            accept = list(table.accept)
+            lexer.add_rule('KEYWORD', 'if|else', 0)
+            # the rows of the old states stay where they were, the states of the new rule are appended
+            self.assertIs(lexer.table, table)
+            self.assertEqual(list(table.accept[:rows]), accept)
+            self.assertGreater(len(table.accept), rows)
+            for _ in range(20):
+                if rng.random() < 0.6 or len(lexer.spec) <= len(SPEC):
+                    lexer.add_rule(f'RULE{rng.randrange(1000)}', rng.choice(regexes), rng.randint(0, len(lexer.spec)))
+                else:
+                    lexer.remove_rule(rng.choice(lexer.spec)[0])
+                reference = Lexer(lexer.spec, workers=workers)
+                self.assertEqual(lexer.to_table(), reference.to_table())
+                for _ in range(20):
+                    word = ''.join(rng.choice('abcdeifls (+)') for _ in range(rng.randint(0, 12)))
+                    self.assertEqual(lexer.lex(word), reference.lex(word), (lexer.spec, word))
+
+    def test_stats(self):
+        self.assertIsNone(Lexer(SPEC).stats)
+        lexer = Lexer(SPEC, stats=True)
+        stats = lexer.stats
+        self.assertEqual(stats.rules, len(SPEC))
+        self.assertEqual(stats.dfa_states, len(lexer.dfa.K))
+        self.assertEqual(stats.nfa_states, len(lexer.nfa.K))
+        self.assertEqual(stats.alphabet_size, len(lexer.dfa.S))
+        self.assertEqual(stats.peak_subset_size, max(map(len, lexer.dfa.K)))
+        self.assertGreater(stats.subset_construction_time, 0)
+        self.assertGreater(stats.parse_time, 0)
+        lexer.add_rule('KEYWORD', 'if|else')
+        self.assertEqual(stats.rules, len(SPEC) + 1)
+        self.assertEqual(stats.dfa_states, len(lexer.dfa.K))
+        self.assertEqual(json.loads(stats.to_json())['rules'], len(SPEC) + 1)
+
+    def test_table(self):
+        for spec, words in ((SPEC, programs()), (ERROR_SPEC, ERROR_INPUTS)):
+            reference = Lexer(spec)
+            table = reference.to_table()
+            self.assertEqual(set(table.labels), {lexeme for lexeme, _ in spec})
+            lexer = Lexer.from_table(table)
+            for word in words:
+                self.assertEqual(lexer.lex(word), reference.lex(word))
+            self.assertIs(lexer.to_table(), table)
+            self.assertEqual([lexer.state_lexeme(state) for state in range(len(table.accept))], lexer.lexemes)
+        self.assertRaises(ValueError, lexer.add_rule, 'X', 'x')
+
+    def test_shared_table(self):
+        # publisher, pool and unlink run in a process of their own: the resource tracker it starts reports its
+        # errors on that process's stderr, a clean run leaves nothing there
+        root = Path(__file__).resolve().parent.parent
+        script = ('import json\n'
+                  'from test.test_lexer import share_table\n'
+                  'print(json.dumps(share_table()))')
+        result = subprocess.run([sys.executable, '-c', script], cwd=root, capture_output=True, text=True, check=True)
+        self.assertEqual(result.stderr, '')
+        reference = Lexer(SPEC)
+        self.assertEqual([[tuple(token) for token in tokens] for tokens in json.loads(result.stdout)],
+                         [reference.lex(program) for program in programs()])
+
+    def test_shared_table_processes(self):
+        # independent processes attach and exit, the block lives on until the publisher unlinks it
+        reference = Lexer(SPEC)
+        shared_memory = reference.to_table().publish()
+        root = Path(__file__).resolve().parent.parent
+        script = ('import json, sys\n'
+                  'from test.test_lexer import lex_shared\n'
+                  'print(json.dumps(lex_shared(sys.argv[1], sys.argv[2])))')
+        try:
+            for program in programs()[:2]:
+                result = subprocess.run([sys.executable, '-c', script, shared_memory.name, program], cwd=root,
+                                        capture_output=True, text=True, check=True)
+                self.assertEqual([tuple(token) for token in json.loads(result.stdout)], reference.lex(program))
+        finally:
+            shared_memory.close()
+            shared_memory.unlink()
+
+    def test_table_file(self):
+        reference = Lexer(SPEC)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'spec.table')
+            reference.to_table().save(path)
+            table = DFATable.load(path)
+            self.assertEqual(table, reference.to_table())
+            lexer = Lexer.from_table(table)
+            for program in programs():
+                self.assertEqual(lexer.lex(program), reference.lex(program))
+            table.close()
+
+    def test_group_spans(self):
+        lexer = Lexer([('NUMBER', '(?P<digits>[0-9]+)(?P<suffix>(l|u)*)'), ('NAME', '[a-z]+'), ('SPACE', '\\ ')])
+        self.assertEqual(lexer.lex('12ul x 7', groups=True), [
+            ('NUMBER', '12ul', {'digits': (0, 2), 'suffix': (2, 4)}),
+            ('SPACE', ' ', {}),
+            ('NAME', 'x', {}),
+            ('SPACE', ' ', {}),
+            ('NUMBER', '7', {'digits': (7, 8), 'suffix': (8, 8)}),
+        ])
+        self.assertEqual(lexer.lex('12ul x 7'), Lexer([('NUMBER', '[0-9]+(l|u)*'), ('NAME', '[a-z]+'),
+                                                      ('SPACE', '\\ ')]).lex('12ul x 7'))
+
+    def test_long_tokens(self):
+        # a token longer than the recursion limit, and an input made of many tokens
+        lexer = Lexer(SPEC)
+        self.assertEqual(lexer.lex('x' * 100000 + ' 1'), [('LITERAL', 'x' * 100000), ('WHITE_SPACE', ' '),
+                                                          ('LITERAL_NUMBER', '1')])
+        program = '(++ (1 2) (3 4))\n' * 20000
+        tokens = lexer.lex(program)
+        self.assertEqual(len(tokens), 16 * 20000)
+        self.assertEqual(''.join(matched_str for _, matched_str in tokens), program)
+        # a rule longer than the recursion limit
+        lexer = Lexer([('KEYWORD', 'x' * 2000), ('LITERAL', '[a-z]+')])
+        self.assertEqual(lexer.lex('x' * 2000 + 'xy'), [('LITERAL', 'x' * 2000 + 'xy')])
+        self.assertEqual(lexer.lex('x' * 2000), [('KEYWORD', 'x' * 2000)])
+
+    def test_iter_tokens(self):
+        rng = random.Random(0)
+        for spec, words in ((SPEC, programs()), (ERROR_SPEC, ERROR_INPUTS + ['abc', 'abcd', 'ab', 'a\ne'])):
+            lexer = Lexer(spec)
+            for word in words:
+                expected = lexer.lex(word)
+                for _ in range(20):
+                    cuts = sorted(rng.randint(0, len(word)) for _ in range(rng.randint(0, 6)))
+                    chunks = [word[i:j] for i, j in zip([0] + cuts, cuts + [len(word)])]
+                    tokens = list(lexer.iter_tokens(chunks))
+                    if expected and not expected[-1][0]:
+                        self.assertEqual(tokens[-1:], expected, (word, chunks))
+                    else:
+                        self.assertEqual(tokens, expected, (word, chunks))
+                self.assertEqual(list(lexer.iter_tokens(io.StringIO(word)))[-len(expected):], expected)
+
+    def test_iter_tokens_is_lazy(self):
+        def chunks():
+            yield '(++ 1 '
+            yield '2)'
+            raise AssertionError('read past the chunk that completes the tokens')
+
+        tokens = Lexer(SPEC).iter_tokens(chunks())
+        self.assertEqual([next(tokens) for _ in range(5)], [('OPEN_PARENTHESIS', '('), ('CONCAT', '++'),
+                                                             ('WHITE_SPACE', ' '), ('LITERAL_NUMBER', '1'),
+                                                             ('WHITE_SPACE', ' ')])
+
+    def test_scan(self):
+        for spec, words in ((SPEC, programs()), (ERROR_SPEC, ERROR_INPUTS + ['abc', 'abcd', 'ab', 'a\ne'])):
+            lexer = Lexer(spec)
+            for word in words:
+                expected = lexer.lex(word)
+                data = word.encode('ascii')
+                if expected and not expected[-1][0]:
+                    with self.assertRaises(ValueError) as error:
+                        list(lexer.scan(data))
+                    self.assertEqual(str(error.exception), expected[-1][1])
+                else:
+                    tokens = [(lexeme, Lexer.token_text(data, start, end)) for lexeme, start, end in lexer.scan(data)]
+                    self.assertEqual(tokens, expected)
+
+    def test_scan_mmap(self):
+        program = ''.join(programs()).encode('ascii')
+        with tempfile.TemporaryFile() as file:
+            file.write(program)
+            file.flush()
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                self.assertEqual(list(Lexer(SPEC).scan(data)), list(Lexer(SPEC).scan(program)))
+
+    def test_lex_parallel(self):
+        lexer = Lexer(SPEC)
+        program = '\n'.join(programs()) * 5
+        points = lexer.split_points(program, 200)
+        self.assertGreater(len(points), 10)
+        tokens = lexer.lex(program)
+        ends = set(accumulate(len(matched_str) for _, matched_str in tokens))
+        self.assertTrue(ends.issuperset(points[1:]))
+        self.assertEqual(lexer.lex_parallel(program, workers=2, chunk_size=200), tokens)
+        stream = lexer.tokenize_parallel(program, workers=2, chunk_size=200)
+        serial = lexer.tokenize(program)
+        self.assertEqual((stream.kinds, stream.starts, stream.lengths), (serial.kinds, serial.starts, serial.lengths))
+        self.assertIs(stream.source, program)
+        error = program + '\n(+ 1 #)\n' + program
+        self.assertEqual(lexer.lex_parallel(error, workers=2, chunk_size=200), lexer.lex(error))
+        with self.assertRaises(ValueError) as context:
+            lexer.tokenize_parallel(error, workers=2, chunk_size=200)
+        self.assertEqual(str(context.exception), lexer.lex(error)[0][1])
+
+    def test_split_points(self):
+        lexer = Lexer(ERROR_SPEC)
+        # a space is a token of its own, so both of its sides are safe, while "aa" and "bc" can be inside tokens
+        self.assertEqual(lexer.split_points('aaaa bcbc aaaa', 2), [0, 4, 9, 14])
+        self.assertEqual(lexer.split_points('aaaa bcbc aaaa', 1), [0, 4, 5, 9, 10, 14])
+        self.assertEqual(lexer.split_points('aaaaaaaa', 2), [0, 8])
+
+    def test_relex(self):
+        rng = random.Random(0)
+        lookahead_spec = [('X', 'x'), ('LONG', 'xyyyz'), ('Y', 'y')]
+        for spec, alphabet in ((SPEC, 'ab1 ()+:\n\tlambda'), (ERROR_SPEC, 'abcd \n'), (lookahead_spec, 'xyz')):
+            lexer = Lexer(spec)
+            for _ in range(300):
+                word = ''.join(rng.choice(alphabet) for _ in range(rng.randint(0, 25)))
+                tokens = lexer.lex(word)
+                if tokens and not tokens[-1][0]:
+                    continue
+                offset = rng.randint(0, len(word))
+                removed = rng.randint(0, min(3, len(word) - offset))
+                inserted = ''.join(rng.choice(alphabet) for _ in range(rng.randint(0, 3)))
+                new_word = word[:offset] + inserted + word[offset + removed:]
+                new_tokens, (first, old_end, new_end) = lexer.relex(tokens, (offset, removed, inserted))
+                self.assertEqual(new_tokens, lexer.lex(new_word), (word, offset, removed, inserted))
+                if new_tokens and new_tokens[-1][0]:
+                    self.assertEqual(new_tokens[:first], tokens[:first])
+                    self.assertEqual(new_tokens[new_end:], tokens[old_end:])
+
+    def test_relex_range(self):
+        lexer = Lexer(SPEC)
+        tokens = lexer.lex('(++ (1 2) (3 4))')
+        new_tokens, changed = lexer.relex(tokens, (5, 1, '10'))
+        self.assertEqual(new_tokens, lexer.lex('(++ (10 2) (3 4))'))
+        self.assertEqual(changed, (4, 5, 5))
+        self.assertEqual(new_tokens[4], ('LITERAL_NUMBER', '10'))
+        # the lookahead of the first "x" reaches the end, so relexing has to go back to the start
+        lexer = Lexer([('X', 'x'), ('LONG', 'xyyyz'), ('Y', 'y')])
+        new_tokens, changed = lexer.relex(lexer.lex('xyyy'), (4, 0, 'z'))
+        self.assertEqual((new_tokens, changed), ([('LONG', 'xyyyz')], (0, 4, 1)))
+
+    def test_tokenize(self):
+        lexer = Lexer(SPEC)
+        for program in programs():
+            tokens = lexer.tokenize(program)
+            self.assertEqual(list(tokens), lexer.lex(program))
+            self.assertEqual(list(lexer.tokenize(program.encode('ascii'))), lexer.lex(program))
+            self.assertEqual(Parser(tokens).parse(), Parser(lexer.lex(program)).parse())
+        tokens = lexer.tokenize(b'(++ 12 x)')
+        self.assertIsInstance(tokens.view(2), memoryview)
+        self.assertEqual(bytes(tokens.view(2)), b' ')
+        self.assertEqual([tokens.kind(index) for index in range(len(tokens))],
+                         ['OPEN_PARENTHESIS', 'CONCAT', 'WHITE_SPACE', 'LITERAL_NUMBER', 'WHITE_SPACE', 'LITERAL',
+                          'CLOSED_PARENTHESIS'])
+        self.assertEqual(tokens[1:4], lexer.lex('(++ 12 x)')[1:4])
+        self.assertEqual(tokens[::-3], lexer.lex('(++ 12 x)')[::-3])
+        self.assertEqual(tokens[-1], ('CLOSED_PARENTHESIS', ')'))
+        self.assertEqual(list(tokens.without({'WHITE_SPACE'})),
+                         [('OPEN_PARENTHESIS', '('), ('CONCAT', '++'), ('LITERAL_NUMBER', '12'), ('LITERAL', 'x'),
+                          ('CLOSED_PARENTHESIS', ')')])
+        # characters outside ascii are scanned by code point, so offsets and errors are the ones of lex
+        for word in ('ab é', 'aé', 'é'):
+            with self.assertRaises(ValueError) as error:
+                lexer.tokenize(word)
+            self.assertEqual(str(error.exception), lexer.lex(word)[0][1])
+
+    def test_token_locations(self):
+        lexer = Lexer(SPEC)
+        program = '(lambda x: (+ x 1)\n\t(2))\n\n(++ (3) ())'
+        for source in (program, program.encode('ascii'), memoryview(program.encode('ascii'))):
+            tokens = lexer.tokenize(source).without({'WHITE_SPACE', 'NEW_LINE', 'TAB'})
+            locations = {tokens.text(index): tokens.location(index) for index in range(len(tokens))}
+            self.assertEqual(locations['lambda'], (0, 1))
+            self.assertEqual(locations['1'], (0, 16))
+            self.assertEqual(locations['2'], (1, 2))
+            self.assertEqual(locations['++'], (3, 1))
+            self.assertEqual(locations['()'], (3, 8))
+            self.assertEqual([source[tokens.start(index):tokens.end(index)] for index in range(3)],
+                             [source[0:1], source[1:7], source[8:9]])
+        self.assertEqual(LineIndex('a\nb\n').locate(4), (2, 0))
+
+    def test_skip(self):
+        lexer = Lexer(SPEC)
+        skipping = Lexer(SPEC, skip=SKIP)
+        for program in programs():
+            expected = [token for token in lexer.lex(program) if token[0] not in SKIP]
+            self.assertEqual(skipping.lex(program), expected)
+            self.assertEqual(list(skipping.tokenize(program)), expected)
+        program = '\n'.join(programs()) * 5
+        self.assertEqual(skipping.lex_parallel(program, workers=2, chunk_size=200), skipping.lex(program))
+        tokens = skipping.tokenize(program)
+        self.assertIs(Parser(tokens).tokens, tokens)
+        # the skipped new lines still count for the errors
+        for word in ('(+ 1\n\n 2 #)', '\n \n   #', '(\t\n@'):
+            self.assertEqual(skipping.lex(word), lexer.lex(word))
+        self.assertRaises(ValueError, skipping.relex, skipping.lex('a b'), (0, 1, 'c'))
+
+    def test_recover(self):
+        lexer = Lexer(SPEC, skip=SKIP)
+        tokens = lexer.tokenize('(+ 1 #\n  @@ x) é 2', recover=True)
+        self.assertEqual(list(tokens), [('OPEN_PARENTHESIS', '('), ('SUM', '+'), ('LITERAL_NUMBER', '1'),
+                                        ('LITERAL', 'x'), ('CLOSED_PARENTHESIS', ')'), ('LITERAL_NUMBER', '2')])
+        self.assertEqual(tokens.errors, [LexError(5, 6, 0, 5), LexError(9, 11, 1, 2), LexError(15, 16, 1, 8)])
+        self.assertEqual(str(tokens.errors[1]), 'No viable alternative at character 2, line 1')
+        # a prefix that starts a token but never completes one is an error too, the scan restarts after it
+        lexer = Lexer(ERROR_SPEC)
+        tokens = lexer.tokenize('ebc abe', recover=True)
+        self.assertEqual(list(tokens), [('BCS', 'bc'), ('SPACE', ' '), ('AS', 'a')])
+        self.assertEqual([(error.start, error.end) for error in tokens.errors], [(0, 1), (5, 7)])
+        # the characters read by a failed scan are not scanned again, and adjacent errors are merged into one
+        lexer = Lexer([('AB', 'a*b'), ('SP', '\\ ')])
+        tokens = lexer.tokenize('a' * 100_000, recover=True)
+        self.assertEqual((list(tokens), tokens.errors), ([], [LexError(0, 100_000, 0, 0)]))
+        tokens = lexer.tokenize('aa aab cca ', recover=True)
+        self.assertEqual(list(tokens), [('SP', ' '), ('AB', 'aab'), ('SP', ' '), ('SP', ' ')])
+        self.assertEqual([(error.start, error.end) for error in tokens.errors], [(0, 2), (7, 10)])
+        lexer = Lexer(SPEC)
+        for program in programs():
+            tokens = lexer.tokenize(program, recover=True)
+            self.assertEqual((list(tokens), tokens.errors), (lexer.lex(program), []))
+
+    def test_re_backend(self):
+        rng = random.Random(0)
+        for spec, skip, words in ((SPEC, (), programs()), (SPEC, SKIP, programs()), (ERROR_SPEC, (), ERROR_INPUTS)):
+            reference = Lexer(spec, skip=skip)
+            lexer = Lexer(spec, skip=skip, backend='re')
+            for word in words:
+                self.assertEqual(lexer.lex(word), reference.lex(word))
+            alphabet = ''.join(sorted({char for _, regex in spec for char in regex if char not in '()|*+\\'})) + '#'
+            corpus = [''.join(rng.choice(alphabet) for _ in range(rng.randint(0, 25))) for _ in range(500)]
+            self.assertEqual(reference.check_backend(corpus + words), [])
+        # the first rule wins a tie and the longest match wins over the order of the rules
+        lexer = Lexer([('A', 'a'), ('B', 'ab'), ('AS', 'a*'), ('SPACE', '\\ '), ('KEYWORD', 'if'), ('NAME', '[f-z]+')],
+                      skip={'SPACE'}, backend='re')
+        self.assertEqual(lexer.lex('aaa ab a if ifs'),
+                         [('AS', 'aaa'), ('B', 'ab'), ('A', 'a'), ('KEYWORD', 'if'), ('NAME', 'ifs')])
+        lexer.add_rule('DIGITS', '[0-9]+')
+        self.assertEqual(lexer.lex('if12'), [('KEYWORD', 'if'), ('DIGITS', '12')])
+        self.assertRaises(ValueError, lexer.add_rule, 'PAIRS', '(10)*1')
+        # a greedy match of a rule that has to give characters back is not always its longest one
+        for rule in ('a*a', '(ab)*a', 'ab|ac'):
+            self.assertRaises(ValueError, Lexer, [('RULE', rule)], backend='re')
+        self.assertRaises(ValueError, Lexer, SPEC, backend='lr')
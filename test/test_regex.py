@@ -0,0 +1,78 @@
+import unittest
+
+from src.Regex import parse_regex, Character, Concat, Epsilon, Union, Star
+
+
+def structure(regex) -> str:
+    # explicit-stack dump of the ast, repr hides the associativity of concatenations
+    parts, stack = [], [regex]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, str):
+            parts.append(node)
+        elif isinstance(node, Character):
+            parts.append(repr(node.char))
+        elif isinstance(node, Epsilon):
+            parts.append('E')
+        elif isinstance(node, (Concat, Union)):
+            stack.extend([')', node.right, ',', node.left, f'{type(node).__name__}('])
+        else:
+            stack.extend([')', node.sub, f'{type(node).__name__}('])
+    return ''.join(parts)
+
+
+class RegexParserTests(unittest.TestCase):
+    def test_ast_shape(self):
+        tests = [
+            ('', "E"),
+            ('a b|c', "Union(Concat('a','b'),'c')"),
+            ('a|b|c', "Union(Union('a','b'),'c')"),
+            ('x(y)+z?', "Concat(Concat('x',Plus('y')),QuestionMark('z'))"),
+            ('((a|b)c)*|d', "Union(Star(Concat(Union('a','b'),'c')),'d')"),
+            ('[a-c]x', "Concat(Union(Union('a','b'),'c'),'x')"),
+            ('\\ +', "Plus(' ')"),
+            ('a**', "Concat(Star('a'),'*')"),
+            ('a||b', "Union('a',Concat('|','b'))"),
+        ]
+        for pattern, expected in tests:
+            self.assertEqual(structure(parse_regex(pattern)), expected, pattern)
+
+    def test_deep_nesting(self):
+        depth = 50000
+        regex = parse_regex('(' * depth + 'a' + ')*' * depth)
+        for _ in range(depth):
+            self.assertIsInstance(regex, Star)
+            regex = regex.sub
+        self.assertIsInstance(regex, Character)
+
+    def test_long_pattern(self):
+        regex = parse_regex('ab' * 100000)
+        length = 0
+        while isinstance(regex, Concat):
+            self.assertIsInstance(regex.right, Character)
+            regex, length = regex.left, length + 1
+        self.assertEqual(length + 1, 200000)
+        # the concatenation is flattened without recursing for its automaton and its string
+        regex = parse_regex('ab' * 10000)
+        self.assertEqual(repr(regex), 'ab' * 10000)
+        self.assertEqual(len(regex.thompson().K), 40000)
+
+    def test_errors(self):
+        self.assertRaises(ValueError, parse_regex, '[a-cx')
+        self.assertRaises(IndexError, parse_regex, '(ab')
+        self.assertRaises(ValueError, parse_regex, '(?P<a>x)(?P<a>y)')
+        self.assertRaises(ValueError, parse_regex, '(?P<a x)')
+
+    def test_groups(self):
+        self.assertEqual(structure(parse_regex('(?P<digits>[0-1]+)x')), "Concat(Group(Plus(Union('0','1'))),'x')")
+        tests = [
+            ('(?P<digits>[0-9]+)(?P<suffix>[a-z]*)', '123ab', {'digits': (0, 3), 'suffix': (3, 5)}),
+            ('(?P<x>a*)(?P<y>a*)', 'aaa', {'x': (0, 3), 'y': (3, 3)}),
+            ('(?P<x>a|ab)(?P<y>c|bcd)', 'abcd', {'x': (0, 1), 'y': (1, 4)}),
+            ('((?P<x>a)|b)*', 'abab', {'x': (2, 3)}),
+            ('x(?P<g>y)?z', 'xz', {'g': None}),
+            ('(?P<g>ab)+', 'aba', None),
+        ]
+        for pattern, word, expected in tests:
+            self.assertEqual(parse_regex(pattern).tdfa().match(word), expected, pattern)
+        self.assertEqual(parse_regex('(?P<g>b)').tdfa().match('b', 10), {'g': (10, 11)})